@@ -1,76 +1,106 @@
+import logging
+
 import wpilib
 from wpimath.kinematics import ChassisSpeeds
-from wpimath.trajectory import (
-    TrajectoryConfig,
-    TrajectoryGenerator,
-    TrapezoidProfileRadians,
-)
+from wpimath.trajectory import Trajectory, TrapezoidProfileRadians
 from wpimath.geometry import Pose2d, Translation2d, Rotation2d
 from wpimath.controller import (
     PIDController,
     ProfiledPIDControllerRadians,
 )
 from commands2 import (
+    Command,
     RunCommand,
     InstantCommand,
     Swerve4ControllerCommand,
     SequentialCommandGroup,
     ParallelCommandGroup,
+    WaitCommand,
 )
-from commands2.button import JoystickButton, CommandPS4Controller
+from commands2.button import JoystickButton
 
-from subsystems.SwerveSubsystem import SwerveSubsystem
+from RobotContext import RobotContext
 from commands.SwerveCommand import SwerveCommand
-from constants import Constants, SwerveConstants
-
-
-from wpimath.filter._filter import SlewRateLimiter
-
-
-def dz(x: float, dz: float = Constants.controller_deadzone):
-    return x if abs(x) > dz else 0
+from commands.AutoRegistry import AutoRegistry
+from commands.CharacterizationCommand import (
+    DRIVE,
+    DYNAMIC,
+    QUASISTATIC,
+    STEER,
+    CharacterizationCommand,
+)
+from constants import Constants, SwerveConstants, AutoConstants
+from util.DrivePipeline import DrivePipeline
+from util.LoopTimer import loop_timer
+from util.Telemetry import telemetry
+from util.TrajectoryCache import TrajectoryCache
+
+logger = logging.getLogger("teleop")
+
+# telemetry of every module, in the same order as the swerve subsystem's modules
+MODULE_NAMES = ("FL", "FR", "BR", "BL")
+MODULE_SIGNALS = (
+    "Drive Position",
+    "Drive Velocity",
+    "Angle",
+    "Desired Speed",
+    "Desired Angle",
+    # duty cycles, and the setpoints of the loops closed on the motor controllers
+    "Drive Output",
+    "Turn Output",
+    "Drive Setpoint",
+    "Turn Setpoint",
+)
+GYRO_SIGNALS = ("Yaw", "Yaw Rate", "Pitch", "Roll")
 
 
 class RobotContainer:
-    swerve_subsystem = SwerveSubsystem()
-
-    controller = CommandPS4Controller(Constants.pilot_controller_id)
-
     field_oriented = False
 
     right_stick_sets_angle = False
 
-    def __init__(self) -> None:
+    def __init__(self, context: RobotContext) -> None:
+        self.context = context
+        self.swerve_subsystem = context.swerve_subsystem
+        self.driver_inputs = context.driver_inputs
+
         self.configure_button_bindings()
 
-        # if self.controller.isConnected():
+        self.drive_pipeline = DrivePipeline(self.swerve_subsystem)
+
+        # if wpilib.DriverStation.isJoystickConnected(Constants.pilot_controller_id):
         #     self.swerve_subsystem.setDefaultCommand(
         #         SwerveCommand(
         #             self.swerve_subsystem,
-        #             self.controller,
+        #             self.drive_pipeline,
+        #             self.driver_inputs,
+        #             Constants.pilot_controller_id,
         #             self.get_right_stick_sets_angle,
         #             self.get_field_oriented,
         #         )
         #     )
 
-        self.x_limiter = SlewRateLimiter(
-            SwerveConstants.kDriveMaxAccelerationMetersPerSecond
-        )
-        self.y_limiter = SlewRateLimiter(
-            SwerveConstants.kDriveMaxAccelerationMetersPerSecond
-        )
-        self.z_limiter = SlewRateLimiter(
-            SwerveConstants.kDriveMaxTurnAccelerationMetersPerSecond
-        )
+        self.configure_telemetry()
 
-        self.rotate_to_angle_pid = PIDController(
-            SwerveConstants.kPRobotTurn,
-            SwerveConstants.kIRobotTurn,
-            SwerveConstants.kDRobotTurn,
-            period=Constants.period,
+        # load (or generate on a cache miss) every trajectory before auto starts
+        self.trajectory_cache = TrajectoryCache()
+        self.trajectories = self.trajectory_cache.load_autos()
+
+        self.auto_registry = AutoRegistry()
+        self.auto_registry.register(
+            "s_curve",
+            lambda: self.make_trajectory_command(self.trajectories["s_curve"]),
+            default=True,
         )
-        self.rotate_to_angle_pid.enableContinuousInput(-180, 180)
-        self.rotate_to_angle_pid.setTolerance(5)  # degrees tolerance
+        # feedforward characterization, fit by commands/CharacterizationCommand.py
+        for mechanism in (DRIVE, STEER):
+            self.auto_registry.register(
+                f"characterize_{mechanism}",
+                lambda mechanism=mechanism: self.make_characterization_command(
+                    mechanism
+                ),
+            )
+        self.auto_registry.publish()
 
     def get_right_stick_sets_angle(self) -> bool:
         return self.right_stick_sets_angle
@@ -78,95 +108,124 @@ class RobotContainer:
     def get_angle(self):
         return self.swerve_subsystem.get_angle()
 
+    def configure_telemetry(self) -> None:
+        # everything sim/LogReplay.py needs to run a recorded match again
+        self.mode_channel = telemetry.channel("Mode")
+        self.input_channels = telemetry.channels(
+            [f"Inputs/{name}" for name in self.driver_inputs.names()]
+        )
+        self.gyro_channels = telemetry.channels(
+            [f"Gyro/{signal}" for signal in GYRO_SIGNALS]
+        )
+        self.module_channels = telemetry.channels(
+            [
+                f"Modules/{module} {signal}"
+                for module in MODULE_NAMES
+                for signal in MODULE_SIGNALS
+            ]
+        )
+        self.pose_channels = telemetry.channels(["Pose/X", "Pose/Y", "Pose/Heading"])
+
+    def get_mode(self) -> int:
+        """the Mode channel: 0 disabled, 1 autonomous, 2 teleop and 3 test"""
+        if not wpilib.DriverStation.isEnabled():
+            return 0
+        if wpilib.DriverStation.isAutonomous():
+            return 1
+        if wpilib.DriverStation.isTest():
+            return 3
+        return 2
+
+    def record_telemetry(self) -> None:
+        """record this loop's inputs, sensors, outputs and pose"""
+        frame = telemetry.frame
+        frame[self.mode_channel] = self.get_mode()
+        frame[self.input_channels] = self.driver_inputs.values
+
+        gyro = self.swerve_subsystem.gyro.snapshot
+        index = self.gyro_channels.start
+        frame[index] = gyro.yaw
+        frame[index + 1] = gyro.yaw_rate
+        frame[index + 2] = gyro.pitch
+        frame[index + 3] = gyro.roll
+
+        index = self.module_channels.start
+        for module in self.swerve_subsystem.modules:
+            snapshot = module.snapshot
+            frame[index] = snapshot.drive_position
+            frame[index + 1] = snapshot.drive_velocity
+            frame[index + 2] = snapshot.turn_angle
+            frame[index + 3] = module.desired_speed
+            frame[index + 4] = module.desired_angle
+            frame[index + 5 : index + 7] = module.get_applied_outputs()
+            frame[index + 7 : index + 9] = module.get_setpoints()
+            index += len(MODULE_SIGNALS)
+
+        pose = self.swerve_subsystem.get_pose()
+        index = self.pose_channels.start
+        frame[index] = pose.X()
+        frame[index + 1] = pose.Y()
+        frame[index + 2] = pose.rotation().radians()
+
+    def sample_sensors(self) -> None:
+        self.driver_inputs.sample(wpilib.Timer.getFPGATimestamp())
+        self.swerve_subsystem.sample_sensors()
+
+    @loop_timer.timed("RobotContainer.teleopPeriodic")
     def teleopPeriodic(self) -> None:
-        if self.controller.getSquareButtonPressed():
-            self.toggle_field_oriented()
-
-        x = dz(self.controller.getRawAxis(0))
-        y = dz(self.controller.getRawAxis(1))
-
-        x = self.x_limiter.calculate(x)
-        y = self.y_limiter.calculate(y)
-
-        chassis_speeds: ChassisSpeeds
-        if self.get_right_stick_sets_angle():
-            rx = dz(self.controller.getRawAxis(4))
-            ry = dz(self.controller.getRawAxis(5))
-
-            magnitude = rx + ry
-
-            if magnitude > 0.25:
-                rotation2d = Rotation2d(rx, ry)
-
-                current_robot_angle = self.swerve_subsystem.get_angle()
-
-                print(current_robot_angle, rotation2d.degrees())
-
-                rotation_speed = self.rotate_to_angle_pid.calculate(
-                    current_robot_angle, rotation2d.degrees()
-                )
-
-                chassis_speeds = ChassisSpeeds(x, y, rotation_speed)
-
-                chassis_speeds = ChassisSpeeds.fromFieldRelativeSpeeds(
-                    chassis_speeds, self.swerve_subsystem.get_rotation2d()
-                )
-
-            # print("SwerveCommand chassis_speeds: ", chassis_speeds)
-        elif self.get_field_oriented():
-            # z = dz(self.controller.getRightX())
-            z = dz(self.controller.getRawAxis(4))
-            z = self.z_limiter.calculate(z)
-            chassis_speeds = ChassisSpeeds.fromFieldRelativeSpeeds(
-                chassis_speeds, self.swerve_subsystem.get_rotation2d()
-            )
-        else:
-            # z = dz(self.controller.getRightX())
-            z = dz(self.controller.getRawAxis(4))
-            # z = self.z_limiter.calculate(z) # TODO
-            chassis_speeds = ChassisSpeeds(x, y, z)
-
-        if abs(chassis_speeds.vx) > 0 or abs(chassis_speeds.vy) > 0:
-            print(chassis_speeds)
-
-        swerve_module_states = SwerveConstants.kDriveKinematics.toSwerveModuleStates(
-            chassis_speeds
+        self.drive_pipeline.execute_inputs(
+            self.driver_inputs,
+            Constants.pilot_controller_id,
+            self.get_field_oriented(),
+            self.get_right_stick_sets_angle(),
         )
 
-        # print("SwerveCommand swerve_module_states: ", swerve_module_states)
-
-        self.swerve_subsystem.set_module_states(swerve_module_states)
-
     def get_field_oriented(self) -> bool:
         return self.field_oriented
 
     def toggle_field_oriented(self) -> None:
         self.field_oriented = not self.field_oriented
-        print("Field oriented: ", self.field_oriented)
+        logger.info("field oriented: %s", self.field_oriented)
 
     def configure_button_bindings(self) -> None:
-        if self.controller.isConnected():
-            self.controller.square().onTrue(InstantCommand(self.toggle_field_oriented))
+        # read from the sampled inputs, so it works when the controller connects later
+        self.driver_inputs.button(
+            Constants.pilot_controller_id, wpilib.PS4Controller.Button.kSquare
+        ).onTrue(InstantCommand(self.toggle_field_oriented))
 
     def getAutonomousCommand(self):
-        trajectory_config = TrajectoryConfig(
-            SwerveConstants.kDriveMaxMetersPerSecond,
-            SwerveConstants.kDriveMaxAccelerationMetersPerSecond,
-        )
-        trajectory_config.setKinematics(SwerveConstants.kDriveKinematics)
+        return self.auto_registry.get_selected()
+
+    def make_characterization_command(self, mechanism: str) -> Command:
+        """quasistatic and dynamic runs both ways, pausing so the modules stop"""
+        # the steering needs less voltage to reach its top speed
+        step_voltage = 7.0 if mechanism == DRIVE else 4.0
+        runs = []
+        for test, duration in ((QUASISTATIC, 7.0), (DYNAMIC, 2.0)):
+            for direction in (1, -1):
+                runs.append(
+                    CharacterizationCommand(
+                        self.swerve_subsystem,
+                        mechanism,
+                        test,
+                        direction,
+                        step_voltage=step_voltage,
+                        duration=duration,
+                        period=Constants.period,
+                    )
+                )
+                runs.append(WaitCommand(1.0))
+        return SequentialCommandGroup(*runs)
 
-        trajectory = TrajectoryGenerator.generateTrajectory(
-            Pose2d(0, 0, Rotation2d(0)),
-            [Translation2d(1, 1), Translation2d(2, -1)],
-            Pose2d(3, 0, Rotation2d(0)),
-            trajectory_config,
+    def make_trajectory_command(self, trajectory: Trajectory) -> Command:
+        x_pid = PIDController(
+            AutoConstants.kPTranslation, 0, 0, period=Constants.period
+        )
+        y_pid = PIDController(
+            AutoConstants.kPTranslation, 0, 0, period=Constants.period
         )
-
-        # TODO make these constants in constants.py
-        x_pid = PIDController(0.5, 0, 0, period=Constants.period)
-        y_pid = PIDController(0.5, 0, 0, period=Constants.period)
         theta_pid = ProfiledPIDControllerRadians(
-            0.5,
+            AutoConstants.kPTheta,
             0,
             0,
             TrapezoidProfileRadians.Constraints(3, 3),
@@ -174,6 +233,15 @@ class RobotContainer:
         )
         theta_pid.enableContinuousInput(-180, 180)
 
+        # run the controllers once so the first auto loop doesn't pay for first calls
+        trajectory.sample(0)
+        x_pid.calculate(0, 0)
+        y_pid.calculate(0, 0)
+        theta_pid.calculate(0, 0)
+        x_pid.reset()
+        y_pid.reset()
+        theta_pid.reset(0)
+
         swerve_command = Swerve4ControllerCommand(
             trajectory,
             self.swerve_subsystem.get_pose,
@@ -187,7 +255,7 @@ class RobotContainer:
 
         return SequentialCommandGroup(
             InstantCommand(
-                self.swerve_subsystem.reset_odometer, trajectory.initialPose
+                lambda: self.swerve_subsystem.reset_odometer(trajectory.initialPose())
             ),
             swerve_command,
             InstantCommand(self.swerve_subsystem.stop),
@@ -0,0 +1,23 @@
+from functools import cached_property
+
+from subsystems.DriverInputs import DriverInputs
+from subsystems.SwerveSubsystem import SwerveSubsystem
+from constants import Constants
+
+
+class RobotContext:
+    """
+    Owns the hardware of the robot. Nothing is constructed until it's first
+    used, so importing robot code never touches the hardware. Build it in
+    robotInit and hand it to whatever needs the devices.
+    """
+
+    @cached_property
+    def swerve_subsystem(self) -> SwerveSubsystem:
+        return SwerveSubsystem()
+
+    @cached_property
+    def driver_inputs(self) -> DriverInputs:
+        return DriverInputs(
+            (Constants.pilot_controller_id, Constants.copilot_controller_id)
+        )
@@ -0,0 +1,74 @@
+import logging
+from typing import Callable, Dict, Optional, Set
+from commands2 import Command
+from wpilib import SendableChooser, SmartDashboard, Timer
+
+logger = logging.getLogger("auto")
+
+
+class AutoRegistry:
+    """
+    Builds every autonomous routine's command graph ahead of time (while
+    disabled), so picking one at the start of auto is a dictionary lookup.
+    """
+
+    def __init__(self) -> None:
+        self.factories: Dict[str, Callable[[], Command]] = {}
+        self.commands: Dict[str, Command] = {}
+        # routines that ran and have to be rebuilt before they run again
+        self.used: Set[str] = set()
+
+        self.chooser = SendableChooser()
+        self.default: Optional[str] = None
+
+        self.started_at = -1.0
+        self.start_latency = -1.0
+
+    def register(
+        self, name: str, factory: Callable[[], Command], default: bool = False
+    ) -> None:
+        self.factories[name] = factory
+        if default or self.default is None:
+            self.default = name
+            self.chooser.setDefaultOption(name, name)
+        else:
+            self.chooser.addOption(name, name)
+
+    def publish(self) -> None:
+        SmartDashboard.putData("Auto Routine", self.chooser)
+
+    def build_all(self) -> None:
+        """build every routine that isn't built yet, called while disabled"""
+        for name, factory in self.factories.items():
+            if name not in self.commands or name in self.used:
+                self.commands[name] = factory()
+        self.used.clear()
+
+    def get(self, name: str) -> Optional[Command]:
+        command = self.commands.get(name)
+        if command is None and name in self.factories:
+            # never happens after build_all, but auto should still run
+            logger.warning("auto routine %s was not prebuilt", name)
+            command = self.commands[name] = self.factories[name]()
+        self.used.add(name)
+        return command
+
+    def get_selected(self) -> Optional[Command]:
+        name = self.chooser.getSelected() or self.default
+        return None if name is None else self.get(name)
+
+    def start(self) -> None:
+        """start measuring the time from autonomousInit to the first motor output"""
+        self.started_at = Timer.getFPGATimestamp()
+        self.start_latency = -1.0
+
+    def report_output(self, output_timestamp: float) -> None:
+        if self.started_at < 0 or output_timestamp < self.started_at:
+            return
+
+        self.start_latency = output_timestamp - self.started_at
+        self.started_at = -1.0
+        SmartDashboard.putNumber("Auto Start Latency (ms)", self.start_latency * 1000)
+        logger.info(
+            "first auto output %.1f ms after autonomousInit", self.start_latency * 1000
+        )
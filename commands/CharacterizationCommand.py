@@ -0,0 +1,212 @@
+import argparse
+import logging
+import os
+from typing import Dict, Sequence, Set, Tuple
+
+import numpy as np
+from commands2 import Command, Subsystem
+from wpilib import Timer, getOperatingDirectory
+
+from subsystems.SwerveSubsystem import SwerveSubsystem
+
+logger = logging.getLogger("auto")
+
+DRIVE = "drive"
+STEER = "steer"
+QUASISTATIC = "quasistatic"
+DYNAMIC = "dynamic"
+
+# gains of each mechanism in SwerveConstants
+FEEDFORWARD_CONSTANTS = {DRIVE: "kDriveFeedforward", STEER: "kTurnFeedforward"}
+
+
+class CharacterizationLog:
+    """one characterization run in arrays allocated before it starts"""
+
+    def __init__(self, capacity: int, module_count: int) -> None:
+        self.time = np.zeros(capacity)
+        self.voltage = np.zeros(capacity)
+        # meters and m/s for the drive, radians for the steering
+        self.position = np.zeros((capacity, module_count))
+        self.velocity = np.zeros((capacity, module_count))
+        self.count = 0
+
+    def full(self) -> bool:
+        return self.count == len(self.time)
+
+    def save(self, path: str) -> None:
+        count = self.count
+        np.savez(
+            path,
+            time=self.time[:count],
+            voltage=self.voltage[:count],
+            position=self.position[:count],
+            velocity=self.velocity[:count],
+        )
+
+
+class CharacterizationCommand(Command):
+    """
+    A SysId style run of the drive or steering motors of every module: a
+    quasistatic voltage ramp or a dynamic voltage step. The voltage and the
+    module sensors are logged every loop and saved to `directory` when the
+    run ends, fit() turns the saved runs into feedforward gains.
+    """
+
+    def __init__(
+        self,
+        swerve_subsystem: SwerveSubsystem,
+        mechanism: str,
+        test: str,
+        direction: int = 1,
+        ramp_rate: float = 1.0,
+        step_voltage: float = 7.0,
+        duration: float = 7.0,
+        directory: str = os.path.join(getOperatingDirectory(), "characterization"),
+        period: float = 0.02,
+    ) -> None:
+        super().__init__()
+
+        self.swerve_subsystem = swerve_subsystem
+        self.mechanism = mechanism
+        self.test = test
+        self.direction = direction
+        self.ramp_rate = ramp_rate
+        self.step_voltage = step_voltage
+        self.duration = duration
+        self.path = os.path.join(
+            directory,
+            f"{mechanism}_{test}_{'forward' if direction > 0 else 'backward'}.npz",
+        )
+
+        self.log = CharacterizationLog(
+            round(duration / period) + 1, len(swerve_subsystem.modules)
+        )
+        self.started_at = 0.0
+        # the sensors sampled this loop answer the previous loop's voltage
+        self.voltage = 0.0
+
+    def getRequirements(self) -> Set[Subsystem]:
+        return {self.swerve_subsystem}
+
+    def initialize(self) -> None:
+        self.started_at = Timer.getFPGATimestamp()
+        self.log.count = 0
+        self.voltage = 0.0
+
+    def execute(self) -> None:
+        time = Timer.getFPGATimestamp() - self.started_at
+
+        log = self.log
+        if not log.full():
+            row = log.count
+            log.time[row] = time
+            log.voltage[row] = self.voltage
+            for i, module in enumerate(self.swerve_subsystem.modules):
+                snapshot = module.snapshot
+                if self.mechanism == DRIVE:
+                    log.position[row, i] = snapshot.drive_position
+                    log.velocity[row, i] = snapshot.drive_velocity
+                else:
+                    log.position[row, i] = snapshot.turn_angle
+            log.count += 1
+
+        if self.test == QUASISTATIC:
+            self.voltage = self.direction * self.ramp_rate * time
+        else:
+            self.voltage = self.direction * self.step_voltage
+
+        for module in self.swerve_subsystem.modules:
+            if self.mechanism == DRIVE:
+                module.set_characterization_voltage(self.voltage)
+            else:
+                module.set_characterization_voltage(0.0, self.voltage)
+
+    def isFinished(self) -> bool:
+        return (
+            self.log.full()
+            or Timer.getFPGATimestamp() - self.started_at >= self.duration
+        )
+
+    def end(self, interrupted: bool) -> None:
+        self.swerve_subsystem.stop()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.log.save(self.path)
+        logger.info("saved %d samples to %s", self.log.count, self.path)
+
+
+def load_run(path: str, mechanism: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """voltage, velocity and acceleration of a saved run, per module"""
+    run = np.load(path)
+    time = run["time"]
+    if mechanism == DRIVE:
+        velocity = run["velocity"]
+    else:
+        # the steering angle wraps around and its velocity isn't logged
+        velocity = np.gradient(np.unwrap(run["position"], axis=0), time, axis=0)
+    acceleration = np.gradient(velocity, time, axis=0)
+    return run["voltage"], velocity, acceleration
+
+
+def fit(
+    paths: Sequence[str], mechanism: str, min_velocity: float = 0.05
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Least squares kS, kV and kA of every module from the runs in `paths`,
+    as a (modules, 3) array, and the r squared of every module's fit.
+    """
+    runs = [load_run(path, mechanism) for path in paths]
+    voltage = np.concatenate([run[0] for run in runs])
+    velocity = np.concatenate([run[1] for run in runs])
+    acceleration = np.concatenate([run[2] for run in runs])
+
+    module_count = velocity.shape[1]
+    gains = np.zeros((module_count, 3))
+    r_squared = np.zeros(module_count)
+    for module in range(module_count):
+        # kS only shows once the module is moving
+        moving = np.abs(velocity[:, module]) > min_velocity
+        v = velocity[moving, module]
+        a = acceleration[moving, module]
+        y = voltage[moving]
+
+        features = np.column_stack((np.sign(v), v, a))
+        gains[module], *_ = np.linalg.lstsq(features, y, rcond=None)
+
+        residual = y - features @ gains[module]
+        total = np.sum((y - y.mean()) ** 2)
+        r_squared[module] = 1 - np.sum(residual**2) / max(total, 1e-12)
+
+    return gains, r_squared
+
+
+def save_feedforward(mechanism: str, gains: np.ndarray, path: str) -> None:
+    """write fitted (modules, 3) gains to the gains file that constants.py loads"""
+    from constants import save_gains
+
+    tuned: Dict[str, list] = {FEEDFORWARD_CONSTANTS[mechanism]: gains.tolist()}
+    save_gains("SwerveConstants", tuned, path)
+
+
+def main() -> None:
+    from constants import gains_file
+
+    parser = argparse.ArgumentParser(
+        description=f"fit feedforward gains to characterization runs and write "
+        f"them to {gains_file}"
+    )
+    parser.add_argument("mechanism", choices=(DRIVE, STEER))
+    parser.add_argument("runs", nargs="+", help="saved .npz runs of the mechanism")
+    parser.add_argument("--dry-run", action="store_true", help="don't write the file")
+    args = parser.parse_args()
+
+    gains, r_squared = fit(args.runs, args.mechanism)
+    for module, ((kS, kV, kA), r2) in enumerate(zip(gains, r_squared)):
+        print(f"module {module}: kS {kS:.4f}  kV {kV:.4f}  kA {kA:.4f}  r2 {r2:.3f}")
+
+    if not args.dry_run:
+        save_feedforward(args.mechanism, gains, gains_file)
+
+
+if __name__ == "__main__":
+    main()
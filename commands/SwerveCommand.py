@@ -1,28 +1,27 @@
-import math
+import logging
+
 from commands2 import Command, Subsystem
-from commands2.button import JoystickButton, CommandPS4Controller
-from wpimath.controller import PIDController
-from wpimath.kinematics import ChassisSpeeds
-from wpimath.geometry import Rotation2d
-from wpimath.filter._filter import SlewRateLimiter
+from commands2.button import JoystickButton
+from subsystems.DriverInputs import DriverInputs
 from subsystems.SwerveSubsystem import SwerveSubsystem
 from typing import Callable, Set
 
-from constants import Constants, SwerveConstants
-
+from util.DrivePipeline import DrivePipeline
 
-def dz(x: float, dz: float = Constants.controller_deadzone):
-    return x if abs(x) > dz else 0
+logger = logging.getLogger("teleop")
 
 
 class SwerveCommand(Command):
     def __init__(
         self,
         swerve_subsystem: SwerveSubsystem,
+        # shared with teleopPeriodic so the slew rate limiters carry over
+        drive_pipeline: DrivePipeline,
         # get_x: Callable[[None], float],
         # get_y: Callable[[None], float],
         # get_z: Callable[[None], float],
-        controller: CommandPS4Controller,
+        driver_inputs: DriverInputs,
+        port: int,
         get_right_stick_sets_angle: Callable[[], bool],
         get_field_oriented: Callable[[], bool],
     ) -> None:
@@ -34,102 +33,29 @@ class SwerveCommand(Command):
         # self.get_y = get_y
         # self.get_z = get_z
 
-        self.controller = controller
+        self.driver_inputs = driver_inputs
+        self.port = port
         self.get_right_stick_sets_angle = get_right_stick_sets_angle
         self.get_field_oriented = get_field_oriented
 
-        self.x_limiter = SlewRateLimiter(
-            SwerveConstants.kDriveMaxAccelerationMetersPerSecond
-        )
-        self.y_limiter = SlewRateLimiter(
-            SwerveConstants.kDriveMaxAccelerationMetersPerSecond
-        )
-        self.z_limiter = SlewRateLimiter(
-            SwerveConstants.kDriveMaxTurnAccelerationMetersPerSecond
-        )
-
-        self.rotate_to_angle_pid = PIDController(
-            SwerveConstants.kPRobotTurn,
-            SwerveConstants.kIRobotTurn,
-            SwerveConstants.kDRobotTurn,
-            period=Constants.period,
-        )
-        self.rotate_to_angle_pid.enableContinuousInput(-180, 180)
-        self.rotate_to_angle_pid.setTolerance(5)  # degrees tolerance
+        self.drive_pipeline = drive_pipeline
 
     def getRequirements(self) -> Set[Subsystem]:
         return {self.swerve_subsystem}
 
     def initialize(self) -> None:
-        print("SwerveCommand initialized")
-        pass
+        logger.debug("SwerveCommand initialized")
 
     def execute(self) -> None:
-        # x = dz(self.get_x())
-        # y = dz(self.get_y())
-        # z = dz(self.get_z())
-
-        # x = dz(self.controller.getLeftX())
-        # y = dz(self.controller.getLeftY())
-        x = dz(self.controller.getRawAxis(0))
-        y = dz(self.controller.getRawAxis(1))
-
-        x = self.x_limiter.calculate(x)
-        y = self.y_limiter.calculate(y)
-
-        chassis_speeds: ChassisSpeeds
-        if self.get_right_stick_sets_angle():
-            # rx = dz(self.controller.getRightX())
-            # ry = dz(self.controller.getRightY())
-            rx = dz(self.controller.getRawAxis(4))
-            ry = dz(self.controller.getRawAxis(5))
-
-            magnitude = rx + ry
-
-            if magnitude > 0.25:
-                rotation2d = Rotation2d(rx, ry)
-
-                current_robot_angle = self.swerve_subsystem.get_angle()
-
-                print(current_robot_angle, rotation2d.degrees())
-
-                rotation_speed = self.rotate_to_angle_pid.calculate(
-                    current_robot_angle, rotation2d.degrees()
-                )
-
-                chassis_speeds = ChassisSpeeds(x, y, rotation_speed)
-
-                chassis_speeds = ChassisSpeeds.fromFieldRelativeSpeeds(
-                    chassis_speeds, self.swerve_subsystem.get_rotation2d()
-                )
-
-            # print("SwerveCommand chassis_speeds: ", chassis_speeds)
-        elif self.get_field_oriented():
-            # z = dz(self.controller.getRightX())
-            z = dz(self.controller.getRawAxis(4))
-            z = self.z_limiter.calculate(z)
-            chassis_speeds = ChassisSpeeds.fromFieldRelativeSpeeds(
-                chassis_speeds, self.swerve_subsystem.get_rotation2d()
-            )
-        else:
-            # z = dz(self.controller.getRightX())
-            z = dz(self.controller.getRawAxis(4))
-            # z = self.z_limiter.calculate(z) # TODO
-            chassis_speeds = ChassisSpeeds(x, y, z)
-
-        if abs(chassis_speeds.vx) > 0 or abs(chassis_speeds.vy) > 0:
-            print(chassis_speeds)
-
-        swerve_module_states = SwerveConstants.kDriveKinematics.toSwerveModuleStates(
-            chassis_speeds
+        self.drive_pipeline.execute_inputs(
+            self.driver_inputs,
+            self.port,
+            self.get_field_oriented(),
+            self.get_right_stick_sets_angle(),
         )
 
-        # print("SwerveCommand swerve_module_states: ", swerve_module_states)
-
-        self.swerve_subsystem.set_module_states(swerve_module_states)
-
     def end(self, interrupted: bool) -> None:
-        print("SwerveCommand ended")
+        logger.debug("SwerveCommand ended")
         self.swerve_subsystem.stop()
 
     def isFinished(self) -> bool:
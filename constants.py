@@ -1,3 +1,7 @@
+import json
+import os
+
+
 class Constants:
     period = 0.02
 
@@ -8,18 +12,79 @@ class Constants:
     frame_width = 28
     frame_length = 32
 
+    # loop timing ring buffer length (in loops) and NetworkTables publish period
+    loop_timing_buffer_size = 250
+    loop_timing_publish_period = 1.0
+
+    # input to actuation latency histogram bins
+    latency_histogram_bin_ms = 0.25
+    latency_histogram_bins = 80
+
+    # motor commands closer than this to the last one aren't sent again,
+    # unless the last write is older than the keep alive (in seconds)
+    motor_output_epsilon = 1e-4
+    motor_output_keep_alive = 0.1
+
+    # CAN bus bit rate and bits of an 8 byte extended frame with some bit stuffing
+    can_bitrate = 1_000_000
+    can_bits_per_frame = 135
 
+    # telemetry frames queued for the publishing thread before the oldest are
+    # dropped, channels per frame and how often the thread publishes (in seconds)
+    telemetry_queue_size = 250
+    telemetry_max_channels = 256
+    telemetry_publish_period = 0.1
+
+    # seconds between two messages from the same logging call, records kept for
+    # fault dumps, seconds between dumps and between checks for new log levels
+    log_rate_limit_period = 1.0
+    log_ring_buffer_size = 500
+    log_fault_dump_period = 5.0
+    log_level_poll_period = 0.5
+
+    # black box WPILOG files of every telemetry channel: bytes per file before a
+    # new one is started, whether closed files are gzipped, the write buffer size
+    # and how often buffered records are flushed to disk (in seconds). The oldest
+    # logs are deleted to keep min_free_bytes free, like DataLogManager does.
+    datalog_enabled = True
+    datalog_segment_bytes = 32 * 1024 * 1024
+    datalog_compress = True
+    datalog_buffer_bytes = 1024 * 1024
+    datalog_flush_period = 1.0
+    datalog_min_free_bytes = 50 * 1024 * 1024
+    # seconds closing a file waits for the previous one to finish compressing
+    datalog_compress_timeout = 5.0
+
+
+import math
 from wpimath.kinematics import SwerveDrive4Kinematics
-from wpimath.geometry import Translation2d
+from wpimath.geometry import Translation2d, Pose2d, Rotation2d
+from wpimath.units import inchesToMeters
 
 
 class SwerveConstants:
-    kDriveKinematics = SwerveDrive4Kinematics(
-        Translation2d(-Constants.frame_width / 2, Constants.frame_length / 2),
-        Translation2d(Constants.frame_width / 2, Constants.frame_length / 2),
-        Translation2d(Constants.frame_width / 2, -Constants.frame_length / 2),
-        Translation2d(-Constants.frame_width / 2, -Constants.frame_length / 2),
+    # front left, front right, back right, back left, in meters (the frame is in
+    # inches). Check on the robot: spinning in place has to turn the modules 45
+    # degrees off the frame, and the odometry's heading has to follow the gyro.
+    kModuleTranslations = (
+        Translation2d(
+            inchesToMeters(-Constants.frame_width / 2),
+            inchesToMeters(Constants.frame_length / 2),
+        ),
+        Translation2d(
+            inchesToMeters(Constants.frame_width / 2),
+            inchesToMeters(Constants.frame_length / 2),
+        ),
+        Translation2d(
+            inchesToMeters(Constants.frame_width / 2),
+            inchesToMeters(-Constants.frame_length / 2),
+        ),
+        Translation2d(
+            inchesToMeters(-Constants.frame_width / 2),
+            inchesToMeters(-Constants.frame_length / 2),
+        ),
     )
+    kDriveKinematics = SwerveDrive4Kinematics(*kModuleTranslations)
 
     fl_drive_id = 2
     fl_turn_id = 3
@@ -51,7 +116,150 @@ class SwerveConstants:
 
     kWheelMaxSpeedMetersPerSecond = 5.0
 
+    # rate of the odometry thread (100-250 Hz), 0 samples once per main loop instead.
+    # The navX is updated at this rate too, up to its 200 Hz.
+    kOdometryFrequencyHz = 200
+    # 2 s of poses at the odometry rate
+    kPoseHistoryCapacity = 400
+
+    # the navX is clockwise positive, wpimath (the odometry, field oriented
+    # driving and the heading PID) counterclockwise. Check on the robot: turning
+    # it counterclockwise by hand has to increase "Gyro Angle".
+    kGyroInverted = True
+
+    kDriveEncoderTicksPerRotation = 2048
+    kDriveGearRatio = 6.75
+    kTurnGearRatio = 150 / 7
+    kWheelDiameterMeters = 0.1016
+    # TalonFX integrated sensor ticks to meters travelled by the wheel. Check on
+    # the robot: pushing it 1 m forward has to move the odometry's X by 1 m.
+    kDriveTicksToMeters = (
+        math.pi
+        * kWheelDiameterMeters
+        / (kDriveGearRatio * kDriveEncoderTicksPerRotation)
+    )
+
     kDriveEncoderRotToMeters = 4.0
     kDriveEncoderRotToVelocityMps = 0.5
     kTurnEncoderRotToMeters = 0.5
     kTurnEncoderRotToVelocityMps = 0.25
+
+    # the absolute encoder reports rotations and rotations per minute
+    kTurnEncoderRotToRad = 2 * math.pi
+    kTurnEncoderRpmToRadPerSecond = 2 * math.pi / 60
+
+    # run the steering position and drive velocity loops on the SparkMax and
+    # TalonFX at 1 kHz instead of in Python, the steering uses kPTurning etc.
+    kOnboardControl = False
+    # TalonFX velocity loop, in 1023 output units per tick per 100 ms of error
+    kPDriveVelocity = 0.1
+    kIDriveVelocity = 0
+    kDDriveVelocity = 0
+
+    # motor outputs are voltage compensated, a duty cycle of 1 is this many volts
+    kNominalVoltage = 12.0
+    # (kS volts, kV volts per m/s, kA volts per m/s^2) of every drive motor, and
+    # (kS volts, kV volts per rad/s, kA volts per rad/s^2) of every steering
+    # motor, in module order, fitted by commands/CharacterizationCommand.py
+    kDriveFeedforward = ((0.2, 2.39, 0.3),) * 4
+    kTurnFeedforward = ((0.1, 0.43, 0.01),) * 4
+    # motion profile of the steering, its velocity feeds the steering feedforward
+    kTurnMaxRadPerSecond = 20.0
+    kTurnMaxRadPerSecondSquared = 200.0
+
+
+class AutoConstants:
+    # name: (start pose, interior waypoints, end pose)
+    trajectories = {
+        "s_curve": (
+            Pose2d(0, 0, Rotation2d(0)),
+            (Translation2d(1, 1), Translation2d(2, -1)),
+            Pose2d(3, 0, Rotation2d(0)),
+        ),
+    }
+
+    # generated trajectories are cached here, inside the deploy directory
+    trajectory_directory = "trajectories"
+
+    # trajectory following gains
+    kPTranslation = 0.5
+    kPTheta = 0.5
+
+
+class PhysicsConstants:
+    # simulation substeps per second
+    substep_frequency = 1000
+
+    battery_voltage = 12.0
+    robot_mass_kg = 50.0
+
+    # Falcon 500 (TalonFX) drive motors
+    drive_free_speed_rad_per_s = 6380 * 2 * math.pi / 60
+    drive_stall_torque = 4.69
+    drive_stall_current = 257.0
+
+    # NEO (SparkMax) turn motors
+    turn_free_speed_rad_per_s = 5676 * 2 * math.pi / 60
+    turn_stall_torque = 2.6
+    turn_stall_current = 105.0
+
+    # rotating inertia of a module around its steering axis
+    turn_inertia = 0.004
+    # carpet scrub resisting steering, viscous (N m s) and coulomb (N m)
+    turn_viscous_friction = 0.02
+    turn_coulomb_friction = 0.05
+
+    # rolling resistance of a wheel (N) and wheel-carpet friction coefficient
+    drive_rolling_resistance = 5.0
+    wheel_friction_coefficient = 1.1
+    # the wheel's and drive rotor's inertia as a mass at the tread
+    wheel_effective_mass_kg = 2.0
+    # of a uniform plate the size of the frame
+    robot_moment_of_inertia = (
+        robot_mass_kg
+        * (
+            inchesToMeters(Constants.frame_width) ** 2
+            + inchesToMeters(Constants.frame_length) ** 2
+        )
+        / 12
+    )
+
+
+# written by sim/GainTuner.py, the gains in it override the ones above
+gains_file = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "deploy", "gains.json"
+)
+
+
+def load_gains(path: str = gains_file) -> None:
+    try:
+        with open(path) as f:
+            tuned = json.load(f)
+    except FileNotFoundError:
+        return
+
+    for class_name, gains in tuned.items():
+        constants_class = globals()[class_name]
+        for name, value in gains.items():
+            if not hasattr(constants_class, name):
+                raise AttributeError(f"{path}: {class_name} has no gain {name}")
+            setattr(constants_class, name, value)
+
+
+def save_gains(class_name: str, gains: dict, path: str = gains_file) -> None:
+    """merge gains of a constants class into the gains file"""
+    try:
+        with open(path) as f:
+            tuned = json.load(f)
+    except FileNotFoundError:
+        tuned = {}
+
+    tuned.setdefault(class_name, {}).update(gains)
+    # deploy/ isn't in a fresh checkout
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(tuned, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+load_gains()
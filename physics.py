@@ -0,0 +1,288 @@
+import math
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+from hal.simulation import SimDeviceSim
+from wpimath.geometry import Pose2d, Rotation2d
+
+from constants import PhysicsConstants, SwerveConstants
+from util.SwerveKinematics import wrap_angle
+
+
+class DCMotor:
+    """
+    Steady state DC motor model from its datasheet values, vectorized over modules.
+    """
+
+    def __init__(
+        self,
+        free_speed: float,
+        stall_torque: float,
+        stall_current: float,
+        nominal_voltage: float = 12.0,
+    ) -> None:
+        self.resistance = nominal_voltage / stall_current
+        # rad/s per volt and N m per amp
+        self.kv = free_speed / nominal_voltage
+        self.kt = stall_torque / stall_current
+
+    def torque(self, voltage: np.ndarray, speed: np.ndarray) -> np.ndarray:
+        """torque at the motor shaft for a voltage and a shaft speed in rad/s"""
+        return self.kt * (voltage - speed / self.kv) / self.resistance
+
+
+# fraction of the wheel slip the carpet takes out per substep while the wheels
+# grip, lengthwise (against the wheel's own mass) and sideways (against the
+# chassis), low enough that the chassis can't overshoot in one substep
+LONGITUDINAL_GRIP = 0.5
+LATERAL_GRIP = 0.2
+
+
+def smooth_sign(x: np.ndarray, width: float = 1e-3) -> np.ndarray:
+    """sign that ramps linearly around 0 so friction doesn't chatter at rest"""
+    return np.clip(x / width, -1, 1)
+
+
+class PhysicsParams(NamedTuple):
+    """disturbances of a simulated run, the defaults are an ideal robot"""
+
+    battery_voltage: float = PhysicsConstants.battery_voltage
+    # per module, lower values let that wheel slip earlier
+    wheel_friction_coefficients: Optional[Sequence[float]] = None
+    # standard deviation of the noise added to every navX yaw reading
+    gyro_noise_deg: float = 0.0
+    seed: Optional[int] = None
+
+
+class PhysicsEngine:
+    """
+    Simulates the four swerve modules and the chassis. All modules are
+    integrated together on numpy arrays at PhysicsConstants.substep_frequency,
+    and the simulated encoders and navX yaw are fed back to the robot.
+
+    The wheels and the chassis move separately: the carpet pushes each wheel
+    towards the ground speed under it, up to its traction limit, and that
+    force moves the chassis. A wheel that spins or slides past the limit
+    turns its encoder without the robot moving along, like on a real robot.
+    """
+
+    def __init__(
+        self, physics_controller, robot, params: PhysicsParams = PhysicsParams()
+    ) -> None:
+        # None when run by sim/HeadlessRunner instead of the pyfrc simulator
+        self.physics_controller = physics_controller
+        self.params = params
+        self.rng = np.random.default_rng(params.seed)
+
+        self.swerve_subsystem = robot.robot_container.swerve_subsystem
+        self.modules = self.swerve_subsystem.modules
+        self.module_x = np.array(
+            [translation.x for translation in SwerveConstants.kModuleTranslations]
+        )
+        self.module_y = np.array(
+            [translation.y for translation in SwerveConstants.kModuleTranslations]
+        )
+
+        self.drive_motor = DCMotor(
+            PhysicsConstants.drive_free_speed_rad_per_s,
+            PhysicsConstants.drive_stall_torque,
+            PhysicsConstants.drive_stall_current,
+        )
+        self.turn_motor = DCMotor(
+            PhysicsConstants.turn_free_speed_rad_per_s,
+            PhysicsConstants.turn_stall_torque,
+            PhysicsConstants.turn_stall_current,
+        )
+
+        # wheel meters per radian of the drive motor
+        self.drive_radius = (
+            SwerveConstants.kWheelDiameterMeters / 2 / SwerveConstants.kDriveGearRatio
+        )
+        module_count = len(self.modules)
+        self.module_mass = PhysicsConstants.robot_mass_kg / module_count
+        friction_coefficients = params.wheel_friction_coefficients
+        if friction_coefficients is None:
+            friction_coefficients = [
+                PhysicsConstants.wheel_friction_coefficient
+            ] * module_count
+        self.traction_limit = np.array(friction_coefficients) * self.module_mass * 9.81
+        # N per m/s of slip that takes out the grip's share of it in one substep
+        self.longitudinal_grip = (
+            LONGITUDINAL_GRIP * PhysicsConstants.wheel_effective_mass_kg
+        )
+        self.lateral_grip = LATERAL_GRIP * self.module_mass
+
+        # the surface speed of the wheels, which the encoders see
+        self.wheel_position = np.zeros(module_count)
+        self.wheel_speed = np.zeros(module_count)
+        self.turn_angle = np.zeros(module_count)
+        self.turn_speed = np.zeros(module_count)
+
+        # where the chassis really is and how fast it moves, field relative
+        self.pose = np.zeros(3)
+        self.velocity = np.zeros(3)
+
+        self.drive_sims = [
+            module.drive_motor.getSimCollection() for module in self.modules
+        ]
+        navx = SimDeviceSim("navX-Sensor[4]")
+        self.navx_yaw = navx.getDouble("Yaw")
+        self.navx_rate = navx.getDouble("Rate")
+
+        self.write_sensors(np.zeros(3))
+
+    def get_pose(self) -> Pose2d:
+        """where the simulated robot really is, not where the odometry thinks it is"""
+        return Pose2d(self.pose[0], self.pose[1], Rotation2d(self.pose[2]))
+
+    def reset_pose(self, pose: Pose2d) -> None:
+        self.pose[:] = (pose.X(), pose.Y(), pose.rotation().radians())
+        self.velocity[:] = 0
+
+    def update_sim(self, now: float, tm_diff: float) -> None:
+        battery = self.params.battery_voltage
+        # the motors are voltage compensated, up to what the battery can give
+        nominal = min(SwerveConstants.kNominalVoltage, battery)
+        drive_voltage = nominal * np.array(
+            [module.drive_motor.get() for module in self.modules]
+        )
+        turn_voltage = nominal * np.array(
+            [module.turn_motor.get() for module in self.modules]
+        )
+
+        # neither the SparkMax position loop nor the TalonFX velocity loop is
+        # simulated (get() is only the duty cycle), so with onboard control they
+        # run here at the substep rate like they run on the motor controllers
+        turn_setpoints = [module.turn_setpoint for module in self.modules]
+        drive_setpoints = [module.drive_velocity_setpoint for module in self.modules]
+        onboard = None not in turn_setpoints and None not in drive_setpoints
+        if onboard:
+            turn_setpoints = np.array(turn_setpoints)
+            drive_setpoints = np.array(drive_setpoints)
+            drive_kS, drive_kV, _ = np.array(
+                [module.drive_feedforward_gains for module in self.modules]
+            ).T
+            # the arbitrary feedforward, none for a zero setpoint
+            drive_feedforward = drive_kS * np.sign(drive_setpoints) + (
+                drive_kV * drive_setpoints
+            )
+
+        # the same integration step however often the sensors are written
+        substeps = max(1, round(tm_diff * PhysicsConstants.substep_frequency))
+        dt = tm_diff / substeps
+        chassis_speeds = np.zeros(3)
+        for _ in range(substeps):
+            if onboard:
+                turn_voltage = nominal * np.clip(
+                    SwerveConstants.kPTurning
+                    * wrap_angle(turn_setpoints - self.turn_angle),
+                    -1,
+                    1,
+                )
+                # kP is in 1023 output units per tick per 100 ms of error
+                drive_error = (
+                    (drive_setpoints - self.wheel_speed)
+                    / SwerveConstants.kDriveTicksToMeters
+                    / 10
+                )
+                drive_voltage = nominal * np.clip(
+                    drive_feedforward / SwerveConstants.kNominalVoltage
+                    + SwerveConstants.kPDriveVelocity * drive_error / 1023,
+                    -1,
+                    1,
+                )
+            chassis_speeds = self.step(drive_voltage, turn_voltage, dt)
+
+        self.write_sensors(chassis_speeds)
+
+        if self.physics_controller is not None:
+            self.physics_controller.field.setRobotPose(self.get_pose())
+
+    def step(
+        self, drive_voltage: np.ndarray, turn_voltage: np.ndarray, dt: float
+    ) -> np.ndarray:
+        """
+        Integrate every module and the chassis over one substep, returns the
+        chassis' robot relative (vx, vy, omega).
+        """
+        heading = self.pose[2]
+        cos, sin = math.cos(heading), math.sin(heading)
+        field_vx, field_vy, omega = self.velocity
+        vx = field_vx * cos + field_vy * sin
+        vy = field_vy * cos - field_vx * sin
+
+        # the ground speed under every wheel, along and across it
+        ground_x = vx - omega * self.module_y
+        ground_y = vy + omega * self.module_x
+        wheel_cos, wheel_sin = np.cos(self.turn_angle), np.sin(self.turn_angle)
+        ground_along = ground_x * wheel_cos + ground_y * wheel_sin
+        ground_across = ground_y * wheel_cos - ground_x * wheel_sin
+
+        # the carpet grips up to the traction limit, then the wheel slips
+        along = self.longitudinal_grip / dt * (self.wheel_speed - ground_along)
+        across = -self.lateral_grip / dt * ground_across
+        scale = np.minimum(
+            1, self.traction_limit / np.maximum(np.hypot(along, across), 1e-9)
+        )
+        along *= scale
+        across *= scale
+
+        drive_torque = self.drive_motor.torque(
+            drive_voltage, self.wheel_speed / self.drive_radius
+        )
+        motor_force = drive_torque / self.drive_radius
+        motor_force -= PhysicsConstants.drive_rolling_resistance * smooth_sign(
+            self.wheel_speed
+        )
+        self.wheel_speed += (
+            (motor_force - along) / PhysicsConstants.wheel_effective_mass_kg * dt
+        )
+        self.wheel_position += self.wheel_speed * dt
+
+        # the carpet's push on the chassis at every wheel, robot relative
+        force_x = along * wheel_cos - across * wheel_sin
+        force_y = along * wheel_sin + across * wheel_cos
+        torque = float(np.sum(self.module_x * force_y - self.module_y * force_x))
+        total_x, total_y = float(np.sum(force_x)), float(np.sum(force_y))
+        self.velocity[0] += (
+            (total_x * cos - total_y * sin) / PhysicsConstants.robot_mass_kg * dt
+        )
+        self.velocity[1] += (
+            (total_x * sin + total_y * cos) / PhysicsConstants.robot_mass_kg * dt
+        )
+        self.velocity[2] += torque / PhysicsConstants.robot_moment_of_inertia * dt
+        self.pose += self.velocity * dt
+
+        turn_torque = SwerveConstants.kTurnGearRatio * self.turn_motor.torque(
+            turn_voltage, self.turn_speed * SwerveConstants.kTurnGearRatio
+        )
+        turn_torque -= PhysicsConstants.turn_viscous_friction * self.turn_speed
+        turn_torque -= PhysicsConstants.turn_coulomb_friction * smooth_sign(
+            self.turn_speed, 0.05
+        )
+        self.turn_speed += turn_torque / PhysicsConstants.turn_inertia * dt
+        self.turn_angle = wrap_angle(self.turn_angle + self.turn_speed * dt)
+
+        return np.array((vx, vy, omega))
+
+    def write_sensors(self, chassis_speeds: np.ndarray) -> None:
+        ticks_per_meter = 1 / SwerveConstants.kDriveTicksToMeters
+        for i, (module, drive_sim) in enumerate(zip(self.modules, self.drive_sims)):
+            drive_sim.setBusVoltage(self.params.battery_voltage)
+            drive_sim.setIntegratedSensorRawPosition(
+                int(self.wheel_position[i] * ticks_per_meter)
+            )
+            # ticks per 100 ms
+            drive_sim.setIntegratedSensorVelocity(
+                int(self.wheel_speed[i] * ticks_per_meter / 10)
+            )
+            module.sim_turn_angle = float(self.turn_angle[i])
+
+        yaw = math.degrees(wrap_angle(self.pose[2]))
+        if self.params.gyro_noise_deg > 0:
+            yaw += self.rng.normal(0, self.params.gyro_noise_deg)
+
+        # the navX is clockwise positive
+        self.navx_yaw.set(-yaw)
+        if self.navx_rate:
+            self.navx_rate.set(-math.degrees(chassis_speeds[2]))
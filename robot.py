@@ -1,3 +1,8 @@
+from time import perf_counter
+
+import_start = perf_counter()
+
+import logging
 import math
 import wpilib as wp
 from subsystems.SwerveModule import SwerveModule
@@ -14,8 +19,20 @@ import rev
 
 from commands.SwerveCommand import SwerveCommand
 from RobotContainer import RobotContainer
+from RobotContext import RobotContext
 
 from constants import Constants
+from util.DataLog import DataLogWriter
+from util.LatencyHistogram import input_latency
+from util.LoopTimer import loop_timer
+from util.RobotLog import robot_log
+from util.Telemetry import telemetry
+
+import_time = perf_counter() - import_start
+
+logger = logging.getLogger("startup")
+loop_logger = logging.getLogger("loop")
+auto_logger = logging.getLogger("auto")
 
 
 class Robot(wp.TimedRobot):
@@ -23,11 +40,11 @@ class Robot(wp.TimedRobot):
         super().__init__(period)
 
     def robotInit(self) -> None:
-        # self.smartDashboard = NetworkTables.getTable("SmartDashboard")
-        network_table_instance = NetworkTableInstance.getDefault()
-        self.smartDashboard = network_table_instance.getTable("SmartDashboard")
-        self.gyroTopic = self.smartDashboard.getFloatTopic("Gyro Angle").publish()
-        self.turner_topic = self.smartDashboard.getFloatTopic("Turn Encoder").publish()
+        robot_log.configure()
+        # dashboard values are recorded every loop and published off the loop thread
+        if Constants.datalog_enabled:
+            telemetry.add_sink(DataLogWriter())
+        telemetry.start()
         # # create ps4 controller
         # self.controller = wp.PS4Controller(0)
 
@@ -37,30 +54,83 @@ class Robot(wp.TimedRobot):
         #     rev.SparkMaxAbsoluteEncoder.Type.kDutyCycle
         # )
 
-        self.robot_container = RobotContainer()
+        self.auto_command = None
+
+        startup_start = perf_counter()
+        self.robot_context = RobotContext()
+        self.robot_container = RobotContainer(self.robot_context)
+        startup_time = perf_counter() - startup_start
+
+        logger.info(
+            "imports took %.1f ms, robotInit took %.1f ms",
+            import_time * 1000,
+            startup_time * 1000,
+        )
 
     def robotPeriodic(self) -> None:
-        self.gyroTopic.set(self.robot_container.get_angle())
+        robot_periodic_start = loop_timer.start()
 
-        self.turner_topic.set(
-            # self.robot_container.swerve_subsystem.front_left.turn_encoder.getPosition()
-            # % math.pi
-            # * 2
-            self.robot_container.swerve_subsystem.front_left.get_position().angle.degrees()
+        swerve_subsystem = self.robot_container.swerve_subsystem
+        telemetry.record("Gyro Angle", self.robot_container.get_angle())
+        telemetry.record(
+            "Turn Encoder", swerve_subsystem.front_left.get_position().angle.degrees()
+        )
+        telemetry.record(
+            "Hardware Reads Per Tick", swerve_subsystem.hardware_reads_per_tick
+        )
+        telemetry.record(
+            "Suppressed Motor Writes", swerve_subsystem.get_suppressed_writes()
         )
+        telemetry.record("Motor Writes", swerve_subsystem.get_motor_writes())
 
+        scheduler_start = loop_timer.start()
         try:
             CommandScheduler.getInstance().run()
-        except:
-            print("CommandScheduler error")
+        except Exception:
+            loop_logger.exception("CommandScheduler error")
+            robot_log.dump("scheduler")
+        loop_timer.stop("CommandScheduler.run", scheduler_start)
+
+        self.robot_container.auto_registry.report_output(
+            self.robot_container.swerve_subsystem.get_output_timestamp()
+        )
+
+        loop_timer.stop("Robot.robotPeriodic", robot_periodic_start)
+        loop_timer.end_loop()
+        input_latency.end_loop()
+        self.robot_container.record_telemetry()
+        telemetry.record("Loop Time", loop_timer.last_loop_time * 1000)
+        telemetry.end_loop(wp.Timer.getFPGATimestamp())
+        robot_log.poll()
+
+    def begin_loop(self) -> None:
+        # the mode periodic functions run before robotPeriodic in every loop,
+        # so the loop starts there and sensors are sampled fresh for the whole loop
+        loop_timer.begin_loop()
+        self.robot_container.sample_sensors()
+
+    def disabledInit(self) -> None:
+        # build the auto command graphs now instead of in autonomousInit
+        self.robot_container.auto_registry.build_all()
+
+    def disabledPeriodic(self) -> None:
+        self.begin_loop()
+
+    def autonomousPeriodic(self) -> None:
+        self.begin_loop()
+
+    def testPeriodic(self) -> None:
+        self.begin_loop()
 
     def autonomousInit(self) -> None:
-        auto_command = self.robot_container.getAutonomousCommand()
-        if auto_command is not None:
-            auto_command.schedule()
-            print("Auto command scheduled")
+        self.robot_container.auto_registry.start()
+        self.auto_command = self.robot_container.getAutonomousCommand()
+        if self.auto_command is not None:
+            self.auto_command.schedule()
+            auto_logger.info("auto command scheduled")
 
     def teleopPeriodic(self) -> None:
+        self.begin_loop()
         self.robot_container.teleopPeriodic()
 
         # TODO maybe stop the auto command here if executing the swerve drive command doesn't stop it.
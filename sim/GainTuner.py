@@ -0,0 +1,289 @@
+import argparse
+import itertools
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from constants import (
+    AutoConstants,
+    Constants,
+    SwerveConstants,
+    gains_file,
+    save_gains,
+)
+
+Gains = Dict[str, float]
+
+# m/s, the modules only steer while they're asked to drive
+STEERING_DRIVE_SPEED = 0.01
+
+
+class Score(NamedTuple):
+    """lower is better for every field"""
+
+    total: float
+    # mean absolute tracking error
+    tracking_error: float
+    # largest excursion past the setpoint
+    overshoot: float
+    # seconds until the error stays inside the settle band
+    settle_time: float
+
+
+def combine(tracking_error: float, overshoot: float, settle_time: float) -> Score:
+    return Score(
+        tracking_error + 0.5 * overshoot + 0.1 * settle_time,
+        tracking_error,
+        overshoot,
+        settle_time,
+    )
+
+
+def step_response(
+    errors: np.ndarray, step_sizes: np.ndarray, period: float, band: float = 0.02
+) -> Score:
+    """score errors of shape (steps, samples), each row a signed step of `step_sizes`"""
+    relative = errors / step_sizes[:, None]
+    tracking_error = float(np.mean(np.abs(relative)))
+    # the error changes sign once the response passes the setpoint
+    overshoot = float(np.max(np.clip(-relative, 0, None)))
+    outside = np.abs(relative) > band
+    last_outside = np.where(
+        outside.any(axis=1), outside.shape[1] - np.argmax(outside[:, ::-1], axis=1), 0
+    )
+    settle_time = float(np.mean(last_outside)) * period
+    return combine(tracking_error, overshoot, settle_time)
+
+
+def score_steering(gains: Gains) -> Score:
+    """
+    Step responses of the front left module's steering in the headless
+    simulator, through the module's own control law and the physics.
+    """
+    for name, value in gains.items():
+        setattr(SwerveConstants, name, value)
+
+    from sim.HeadlessRunner import TEST, HeadlessRunner
+
+    runner = HeadlessRunner()
+    runner.start()
+    try:
+        module = runner.robot.robot_container.swerve_subsystem.front_left
+        samples = round(1.0 / runner.period)
+
+        # test mode only samples the sensors, the module is commanded here
+        # before every loop from the angle it sampled in the loop before
+        setpoint = 0.0
+        runner.step_callbacks.insert(
+            0,
+            lambda now, period: module.set_optimized_state(
+                STEERING_DRIVE_SPEED, setpoint
+            ),
+        )
+        runner.set_mode(TEST)
+        runner.step(TEST)
+
+        setpoints = np.array((math.pi / 2, -math.pi / 4, math.pi * 0.9))
+        errors = np.zeros((len(setpoints), samples))
+        step_sizes = np.zeros(len(setpoints))
+        for i, setpoint in enumerate(setpoints.tolist()):
+            angle = module.snapshot.turn_angle
+            step_sizes[i] = math.remainder(setpoint - angle, math.tau)
+            for j in range(samples):
+                runner.step(TEST)
+                angle = module.snapshot.turn_angle
+                errors[i, j] = math.remainder(setpoint - angle, math.tau)
+    finally:
+        runner.stop()
+
+    return step_response(errors, step_sizes, runner.period)
+
+
+def score_heading(gains: Gains) -> Score:
+    """
+    Heading step responses of the chassis in the headless simulator, with the
+    right stick setting the angle through the drive pipeline like in teleop.
+    """
+    for name, value in gains.items():
+        setattr(SwerveConstants, name, value)
+
+    from wpilib.simulation import DriverStationSim
+
+    from sim.HeadlessRunner import TELEOP, HeadlessRunner
+
+    port = Constants.pilot_controller_id
+    runner = HeadlessRunner()
+    runner.start()
+    try:
+        runner.robot.robot_container.right_stick_sets_angle = True
+        DriverStationSim.setJoystickAxisCount(port, 6)
+        DriverStationSim.setJoystickButtonCount(port, 14)
+        DriverStationSim.setJoystickPOVCount(port, 1)
+        runner.set_mode(TELEOP)
+        samples = round(2.0 / runner.period)
+
+        setpoints = np.array((90.0, -45.0, 170.0))
+        errors = np.zeros((len(setpoints), samples))
+        step_sizes = np.zeros(len(setpoints))
+        for i, setpoint in enumerate(setpoints.tolist()):
+            # the right stick points where the robot should face
+            DriverStationSim.setJoystickAxis(port, 4, math.cos(math.radians(setpoint)))
+            DriverStationSim.setJoystickAxis(port, 5, math.sin(math.radians(setpoint)))
+            heading = runner.physics.get_pose().rotation().degrees()
+            step_sizes[i] = math.remainder(setpoint - heading, 360)
+            for j in range(samples):
+                runner.step(TELEOP)
+                heading = runner.physics.get_pose().rotation().degrees()
+                errors[i, j] = math.remainder(setpoint - heading, 360)
+    finally:
+        runner.stop()
+
+    return step_response(errors, step_sizes, runner.period)
+
+
+def score_trajectory(gains: Gains) -> Score:
+    """follow the first auto trajectory in the headless simulator"""
+    for name, value in gains.items():
+        setattr(AutoConstants, name, value)
+
+    from sim.HeadlessRunner import AUTONOMOUS, DISABLED, HeadlessRunner
+
+    trajectory_name = next(iter(AutoConstants.trajectories))
+    runner = HeadlessRunner()
+    runner.start()
+    try:
+        runner.set_mode(DISABLED)
+        runner.step(DISABLED)
+
+        trajectory = runner.robot.robot_container.trajectories[trajectory_name]
+        runner.physics.reset_pose(trajectory.initialPose())
+
+        runner.set_mode(AUTONOMOUS)
+        errors = []
+        settle_time = 15.0
+        for step in range(round(15.0 / runner.period)):
+            runner.step(AUTONOMOUS)
+            t = (step + 1) * runner.period
+            expected = trajectory.sample(t).pose.translation()
+            errors.append(runner.physics.get_pose().translation().distance(expected))
+
+            command = runner.robot.auto_command
+            if step > 0 and command is not None and not command.isScheduled():
+                settle_time = t
+                break
+    finally:
+        runner.stop()
+
+    return combine(float(np.mean(errors)), float(np.max(errors)), settle_time)
+
+
+class Scenario(NamedTuple):
+    constants_class: str
+    # gain name: (low, high) search range
+    ranges: Dict[str, Tuple[float, float]]
+    score: Callable[[Gains], Score]
+
+
+SCENARIOS = {
+    "steering": Scenario(
+        "SwerveConstants", {"kPTurning": (0.05, 10.0)}, score_steering
+    ),
+    "heading": Scenario(
+        "SwerveConstants", {"kPRobotTurn": (0.001, 1.0)}, score_heading
+    ),
+    "trajectory": Scenario(
+        "AutoConstants",
+        {"kPTranslation": (0.1, 10.0), "kPTheta": (0.1, 10.0)},
+        score_trajectory,
+    ),
+}
+
+
+def grid(ranges: Dict[str, Tuple[float, float]], points: int) -> List[Gains]:
+    """log spaced grid over every range"""
+    axes = [np.geomspace(low, high, points).tolist() for low, high in ranges.values()]
+    return [dict(zip(ranges, values)) for values in itertools.product(*axes)]
+
+
+def refine(
+    ranges: Dict[str, Tuple[float, float]],
+    results: Sequence[Tuple[Gains, Score]],
+    count: int,
+    rng: np.random.Generator,
+    spread: float,
+) -> List[Gains]:
+    """sample new candidates in log space around the best quarter so far"""
+    ranked = sorted(results, key=lambda result: result[1].total)
+    elite = ranked[: max(1, len(ranked) // 4)]
+    candidates = []
+    for _ in range(count):
+        parent, _ = elite[rng.integers(len(elite))]
+        candidates.append(
+            {
+                name: float(
+                    np.clip(parent[name] * math.exp(rng.normal(0, spread)), low, high)
+                )
+                for name, (low, high) in ranges.items()
+            }
+        )
+    return candidates
+
+
+def tune(
+    scenario: Scenario,
+    points: int,
+    rounds: int,
+    workers: int,
+    seed: int = 0,
+) -> Tuple[Gains, Score]:
+    rng = np.random.default_rng(seed)
+    results: List[Tuple[Gains, Score]] = []
+    # every evaluation gets a fresh process, the simulator's HAL can't be reset
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        candidates = grid(scenario.ranges, points)
+        spread = 0.5
+        for _ in range(rounds + 1):
+            scores = list(executor.map(scenario.score, candidates))
+            results += zip(candidates, scores)
+            candidates = refine(scenario.ranges, results, len(candidates), rng, spread)
+            spread /= 2
+
+    return min(results, key=lambda result: result[1].total)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=f"tune gains in the simulator and write the best to {gains_file}"
+    )
+    parser.add_argument(
+        "scenarios", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS)
+    )
+    parser.add_argument("--points", type=int, default=8, help="grid points per gain")
+    parser.add_argument(
+        "--rounds", type=int, default=2, help="refinement rounds after the grid"
+    )
+    parser.add_argument("--workers", type=int, help="defaults to the cpu count")
+    parser.add_argument("--dry-run", action="store_true", help="don't write the file")
+    args = parser.parse_args()
+
+    for name in args.scenarios:
+        scenario = SCENARIOS[name]
+        gains, score = tune(scenario, args.points, args.rounds, args.workers)
+        print(
+            f"{name}: {gains} score {score.total:.4f} "
+            f"(tracking {score.tracking_error:.4f}, overshoot {score.overshoot:.4f}, "
+            f"settle {score.settle_time:.2f} s)"
+        )
+        if not args.dry_run:
+            save_gains(scenario.constants_class, gains)
+
+
+if __name__ == "__main__":
+    main()
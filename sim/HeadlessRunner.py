@@ -0,0 +1,214 @@
+import argparse
+import csv
+import threading
+from time import perf_counter
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import hal
+import hal.simulation
+import wpilib
+import wpilib.simulation
+from wpilib.simulation import DriverStationSim
+
+from constants import Constants
+from physics import PhysicsEngine, PhysicsParams
+from util.LoopTimer import loop_timer
+
+DISABLED = "disabled"
+AUTONOMOUS = "autonomous"
+TELEOP = "teleop"
+TEST = "test"
+
+
+class Phase(NamedTuple):
+    mode: str
+    duration: float
+
+
+# disabled -> auto -> teleop, like a match
+MATCH = (Phase(DISABLED, 1.0), Phase(AUTONOMOUS, 15.0), Phase(TELEOP, 135.0))
+
+
+class TraceRow(NamedTuple):
+    mode: str
+    time: float
+    x: float
+    y: float
+    heading: float
+    # where the simulated robot really is
+    true_x: float
+    true_y: float
+    true_heading: float
+    loop_ms: float
+
+
+class HeadlessRunner:
+    """
+    Runs the robot through the HAL simulation without the GUI, stepping the
+    simulated clock one period at a time instead of waiting in real time.
+    With `substeps` every period is stepped in that many parts and the physics
+    writes the sensors after each, so notifiers faster than the robot loop
+    (e.g. the odometry thread) read fresh sensors.
+
+    With `run_loop` the robot's competition loop is never started and the
+    runner runs every loop itself, so the loops can't race each other and
+    each can move the clock by its own delta (see sim/LogReplay.py).
+    """
+
+    def __init__(
+        self,
+        robot_class: Optional[type] = None,
+        physics_params: PhysicsParams = PhysicsParams(),
+        substeps: int = 1,
+        run_loop: bool = False,
+    ) -> None:
+        if robot_class is None:
+            from robot import Robot
+
+            robot_class = Robot
+
+        hal.initialize(500, 0)
+        wpilib.simulation.pauseTiming()
+        wpilib.simulation.restartTiming()
+        DriverStationSim.setDsAttached(True)
+
+        self.robot = robot_class()
+        self.period = self.robot.getPeriod()
+        self.substeps = substeps
+        self.run_loop = run_loop
+        self.trace: List[TraceRow] = []
+
+        # called before every step, e.g. to inject controller inputs or step physics
+        self.step_callbacks: List[Callable[[float, float], None]] = []
+
+        self.physics_params = physics_params
+        self.physics: Optional[PhysicsEngine] = None
+
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self.run_robot, daemon=True)
+
+    def run_robot(self) -> None:
+        try:
+            self.robot.startCompetition()
+        except BaseException as e:
+            self.error = e
+
+    def start(self) -> None:
+        if self.run_loop:
+            # what startCompetition does before its loop
+            self.robot.robotInit()
+            self.robot.simulationInit()
+            hal.observeUserProgramStarting()
+        else:
+            self.thread.start()
+            # robotInit has run once the robot reports that the program started
+            hal.simulation.waitForProgramStart()
+
+        self.physics = PhysicsEngine(None, self.robot, self.physics_params)
+        self.step_callbacks.append(self.physics.update_sim)
+
+    def stop(self) -> None:
+        DriverStationSim.setEnabled(False)
+        DriverStationSim.notifyNewData()
+        if self.thread.is_alive():
+            self.robot.endCompetition()
+            self.thread.join(timeout=5)
+        if self.error is not None:
+            raise self.error
+
+    def set_mode(self, mode: str) -> None:
+        DriverStationSim.setAutonomous(mode == AUTONOMOUS)
+        DriverStationSim.setTest(mode == TEST)
+        DriverStationSim.setEnabled(mode != DISABLED)
+
+    def step(self, mode: str, delta: Optional[float] = None) -> None:
+        """
+        One robot loop. With `delta` the clock moves by that much instead of
+        the robot's period, which only makes sense with `run_loop`: the
+        competition loop runs on its own schedule.
+        """
+        if delta is not None and not self.run_loop:
+            raise ValueError("stepping by a delta needs run_loop")
+        period = (self.period if delta is None else delta) / self.substeps
+        for _ in range(self.substeps):
+            now = wpilib.Timer.getFPGATimestamp()
+            for callback in self.step_callbacks:
+                callback(now, period)
+
+            DriverStationSim.notifyNewData()
+            wpilib.simulation.stepTiming(period)
+        if self.run_loop:
+            wpilib.DriverStation.refreshData()
+            self.robot._loopFunc()
+
+        if self.error is not None:
+            raise self.error
+
+        pose = self.robot.robot_container.swerve_subsystem.get_pose()
+        true_pose = self.physics.get_pose()
+        self.trace.append(
+            TraceRow(
+                mode,
+                wpilib.Timer.getFPGATimestamp(),
+                pose.X(),
+                pose.Y(),
+                pose.rotation().degrees(),
+                true_pose.X(),
+                true_pose.Y(),
+                true_pose.rotation().degrees(),
+                loop_timer.last_loop_time * 1000,
+            )
+        )
+
+    def run_phases(self, phases: Sequence[Phase]) -> Tuple[float, float]:
+        """simulated and wall time in seconds"""
+        sim_time = 0.0
+        wall_start = perf_counter()
+        for phase in phases:
+            self.set_mode(phase.mode)
+            for _ in range(round(phase.duration / self.period)):
+                self.step(phase.mode)
+            sim_time += phase.duration
+        return sim_time, perf_counter() - wall_start
+
+    def write_trace(self, path: str) -> None:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(TraceRow._fields)
+            writer.writerows(self.trace)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="run match phases in the simulation as fast as possible"
+    )
+    parser.add_argument("--disabled", type=float, default=MATCH[0].duration)
+    parser.add_argument("--auto", type=float, default=MATCH[1].duration)
+    parser.add_argument("--teleop", type=float, default=MATCH[2].duration)
+    parser.add_argument("--trace", help="csv file for the pose and loop time trace")
+    args = parser.parse_args()
+
+    runner = HeadlessRunner()
+    runner.start()
+    try:
+        sim_time, wall_time = runner.run_phases(
+            (
+                Phase(DISABLED, args.disabled),
+                Phase(AUTONOMOUS, args.auto),
+                Phase(TELEOP, args.teleop),
+            )
+        )
+    finally:
+        runner.stop()
+
+    print(
+        f"simulated {sim_time:.1f} s in {wall_time:.2f} s "
+        f"({sim_time / max(wall_time, 1e-9):.1f}x real time), "
+        f"{loop_timer.overruns} loop overruns of {Constants.period * 1000:.0f} ms"
+    )
+    if args.trace:
+        runner.write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
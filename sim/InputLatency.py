@@ -0,0 +1,78 @@
+import argparse
+import sys
+from typing import List
+
+from wpilib.simulation import DriverStationSim
+
+from constants import Constants
+from sim.HeadlessRunner import TELEOP, HeadlessRunner
+from util.LatencyHistogram import input_latency
+
+# left stick x, like the drive pipeline reads it
+DRIVE_AXIS = 0
+
+
+def measure(trials: int, value: float = 0.5, settle_steps: int = 50) -> List[int]:
+    """
+    Move the stick in the simulator and count the loops until the front left
+    drive motor's command changes, 1 means it changed in the same loop. The
+    command is the duty cycle, or the velocity setpoint with onboard control.
+    """
+    port = Constants.pilot_controller_id
+    runner = HeadlessRunner()
+    runner.start()
+    try:
+        DriverStationSim.setJoystickAxisCount(port, 6)
+        DriverStationSim.setJoystickButtonCount(port, 14)
+        DriverStationSim.setJoystickPOVCount(port, 1)
+        runner.set_mode(TELEOP)
+
+        drive_output = (
+            runner.robot.robot_container.swerve_subsystem.front_left.drive_output
+        )
+        loops = []
+        for _ in range(trials):
+            # release the stick and let the slew rate limiter wind down
+            DriverStationSim.setJoystickAxis(port, DRIVE_AXIS, 0)
+            for _ in range(settle_steps):
+                runner.step(TELEOP)
+                if drive_output.get() == 0:
+                    break
+
+            DriverStationSim.setJoystickAxis(port, DRIVE_AXIS, value)
+            for step in range(1, settle_steps + 1):
+                runner.step(TELEOP)
+                if drive_output.get() != 0:
+                    loops.append(step)
+                    break
+            else:
+                loops.append(settle_steps + 1)
+    finally:
+        runner.stop()
+
+    return loops
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="inject stick moves in the simulator and measure how long the "
+        "robot takes to act on them, fails when it takes more than --max-loops"
+    )
+    parser.add_argument("-n", "--trials", type=int, default=20)
+    parser.add_argument("--max-loops", type=int, default=1)
+    args = parser.parse_args()
+
+    loops = measure(args.trials)
+    print(f"loops from stick move to motor output: min {min(loops)}  max {max(loops)}")
+    for stage, histogram in input_latency.histograms.items():
+        p50, p95, p99, worst = histogram.recent.percentiles()
+        print(
+            f"{stage:10} {histogram.total:6} samples  p50 {p50 * 1000:.3f}  "
+            f"p95 {p95 * 1000:.3f}  p99 {p99 * 1000:.3f}  max {worst * 1000:.3f} ms"
+        )
+
+    sys.exit(0 if max(loops) <= args.max_loops else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+import argparse
+import csv
+import gzip
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from constants import Constants
+from util.DataLog import CONTROL_ENTRY, DATA_HEADER, DATA_RECORD, MAGIC, START
+
+LOOP_TIME = "Loop Time"
+MOTOR_WRITES = "Motor Writes"
+SUPPRESSED_WRITES = "Suppressed Motor Writes"
+MODULES = ("FL", "FR", "BR", "BL")
+POSE = ("Pose/X", "Pose/Y")
+# field relative pose estimates from a camera, not logged by every robot
+VISION = ("Vision/X", "Vision/Y")
+
+# a module only tracks its state while it's asked to move (in m/s)
+MOVING_SPEED = 0.05
+
+# segments of one recording are named FRC_<session>_<segment>.wpilog
+SEGMENT_NAME = re.compile(r"(.*)_(\d{3})\.wpilog(\.gz)?$")
+
+
+class Signal(NamedTuple):
+    timestamps: np.ndarray
+    values: np.ndarray
+
+
+def read(path: str):
+    """the whole file, memory mapped unless it has to be decompressed"""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as file:
+            return file.read()
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def data_run(buffer, position: int, chunk: int = 1 << 16) -> int:
+    """
+    How many fixed width double records follow `position`. Records are checked
+    a chunk at a time as a structured array, so the runs between the few
+    control records never go through Python one record at a time.
+    """
+    count = 0
+    while True:
+        available = (len(buffer) - position) // DATA_RECORD.itemsize
+        if available == 0:
+            return count
+        records = np.frombuffer(buffer, DATA_RECORD, min(chunk, available), position)
+        is_data = (records["header"] == DATA_HEADER) & (
+            records["size"] == DATA_RECORD["value"].itemsize
+        )
+        if not is_data.all():
+            return count + int(np.argmin(is_data))
+        count += len(records)
+        position += records.nbytes
+
+
+def parse(buffer) -> Dict[str, Signal]:
+    """the double entries of a WPILOG file, timestamps in seconds"""
+    if bytes(buffer[: len(MAGIC)]) != MAGIC:
+        raise ValueError("not a WPILOG file")
+    _, extra_length = struct.unpack_from("<HI", buffer, len(MAGIC))
+    position = len(MAGIC) + 6 + extra_length
+
+    # entry id -> name and type
+    entries: Dict[int, Tuple[str, str]] = {}
+    runs: List[np.ndarray] = []
+    # double records written with other field widths, e.g. by WPILib's DataLog
+    other: List[Tuple[int, int, float]] = []
+
+    size = len(buffer)
+    while position < size:
+        count = data_run(buffer, position)
+        if count:
+            runs.append(np.frombuffer(buffer, DATA_RECORD, count, position))
+            position += count * DATA_RECORD.itemsize
+            continue
+
+        header = buffer[position]
+        id_length = (header & 0x3) + 1
+        size_length = ((header >> 2) & 0x3) + 1
+        timestamp_length = ((header >> 4) & 0x7) + 1
+        start = position + 1
+        end = start + id_length + size_length + timestamp_length
+        if end > size:
+            break  # the robot stopped in the middle of a record
+        entry = int.from_bytes(buffer[start : start + id_length], "little")
+        start += id_length
+        payload_size = int.from_bytes(buffer[start : start + size_length], "little")
+        start += size_length
+        timestamp = int.from_bytes(buffer[start:end], "little")
+        position = end + payload_size
+        if position > size:
+            break
+        payload = bytes(buffer[end:position])
+
+        if entry == CONTROL_ENTRY:
+            if payload[0] == START:
+                new_entry, name_length = struct.unpack_from("<II", payload, 1)
+                name = payload[9 : 9 + name_length].decode()
+                (type_length,) = struct.unpack_from("<I", payload, 9 + name_length)
+                offset = 13 + name_length
+                entries[new_entry] = (
+                    name,
+                    payload[offset : offset + type_length].decode(),
+                )
+        elif payload_size == 8:
+            other.append((entry, timestamp, struct.unpack("<d", payload)[0]))
+
+    records = np.concatenate(runs) if runs else np.zeros(0, DATA_RECORD)
+    if other:
+        extra = np.zeros(len(other), DATA_RECORD)
+        extra["entry"], extra["timestamp"], extra["value"] = zip(*other)
+        records = np.concatenate((records, extra))
+
+    # group the records by entry, keeping them in time order within an entry
+    records = records[np.argsort(records["entry"], kind="stable")]
+    ids, starts = np.unique(records["entry"], return_index=True)
+    ends = np.append(starts[1:], len(records))
+    signals: Dict[str, Signal] = {}
+    for entry, start, end in zip(ids.tolist(), starts.tolist(), ends.tolist()):
+        name, entry_type = entries.get(entry, ("", ""))
+        if entry_type != "double":
+            continue
+        signals[name] = Signal(
+            records["timestamp"][start:end] / 1_000_000,
+            records["value"][start:end].copy(),
+        )
+    return signals
+
+
+def load_log(paths: Sequence[str]) -> Dict[str, Signal]:
+    """the signals of one recording, split over one or more segment files"""
+    segments = [parse(read(path)) for path in paths]
+    names = dict.fromkeys(name for signals in segments for name in signals)
+    return {
+        name: Signal(
+            *(
+                np.concatenate(parts)
+                for parts in zip(
+                    *(signals[name] for signals in segments if name in signals)
+                )
+            )
+        )
+        for name in names
+    }
+
+
+def module_signal(signals: Dict[str, Signal], module: str, signal: str) -> np.ndarray:
+    return signals[f"Modules/{module} {signal}"].values
+
+
+def loop_time_report(
+    signals: Dict[str, Signal], period: float = Constants.period
+) -> Dict[str, float]:
+    if LOOP_TIME not in signals:
+        return {}
+    loop_ms = signals[LOOP_TIME].values
+    p50, p95, p99 = np.percentile(loop_ms, (50, 95, 99))
+    return {
+        "loop_ms_mean": loop_ms.mean(),
+        "loop_ms_p50": p50,
+        "loop_ms_p95": p95,
+        "loop_ms_p99": p99,
+        "loop_ms_max": loop_ms.max(),
+        "loop_overrun_fraction": np.mean(loop_ms > period * 1000),
+    }
+
+
+def steering_errors(signals: Dict[str, Signal], module: str) -> np.ndarray:
+    """wrapped angle error in degrees of the loops where the module moves"""
+    error = module_signal(signals, module, "Desired Angle") - module_signal(
+        signals, module, "Angle"
+    )
+    error = np.abs(np.remainder(error + math.pi, 2 * math.pi) - math.pi)
+    moving = np.abs(module_signal(signals, module, "Desired Speed")) > MOVING_SPEED
+    return np.degrees(error[moving])
+
+
+def velocity_errors(signals: Dict[str, Signal], module: str) -> np.ndarray:
+    """measured minus desired drive speed in m/s of the loops where it moves"""
+    desired = module_signal(signals, module, "Desired Speed")
+    moving = np.abs(desired) > MOVING_SPEED
+    return (module_signal(signals, module, "Drive Velocity") - desired)[moving]
+
+
+def module_report(signals: Dict[str, Signal]) -> Dict[str, float]:
+    report: Dict[str, float] = {}
+    for module in MODULES:
+        if f"Modules/{module} Desired Angle" not in signals:
+            continue
+        steering = steering_errors(signals, module)
+        velocity = velocity_errors(signals, module)
+        if len(steering) == 0:
+            continue
+        report[f"steer_deg_mean_{module}"] = steering.mean()
+        report[f"steer_deg_p95_{module}"] = np.percentile(steering, 95)
+        report[f"velocity_rmse_{module}"] = np.sqrt(np.mean(velocity**2))
+        report[f"velocity_abs_p95_{module}"] = np.percentile(np.abs(velocity), 95)
+    return report
+
+
+def vision_report(signals: Dict[str, Signal]) -> Dict[str, float]:
+    """distance between the odometry and the vision poses, skipped without vision"""
+    if not all(name in signals for name in VISION + POSE):
+        return {}
+    vision_x, vision_y = (signals[name] for name in VISION)
+    pose_x, pose_y = (signals[name] for name in POSE)
+    residual = np.hypot(
+        vision_x.values - np.interp(vision_x.timestamps, *pose_x),
+        vision_y.values - np.interp(vision_y.timestamps, *pose_y),
+    )
+    if len(residual) == 0:
+        return {}
+    return {
+        "vision_residual_mean": residual.mean(),
+        "vision_residual_p95": np.percentile(residual, 95),
+        "vision_residual_max": residual.max(),
+    }
+
+
+def can_write_report(signals: Dict[str, Signal]) -> Dict[str, float]:
+    """motor command rates from the cumulative write counters"""
+    if MOTOR_WRITES not in signals:
+        return {}
+    timestamps, writes = signals[MOTOR_WRITES]
+    duration = timestamps[-1] - timestamps[0]
+    if duration <= 0:
+        return {}
+    # writes in every whole second of the recording
+    seconds = np.arange(timestamps[0], timestamps[-1], 1.0)
+    per_second = np.diff(np.interp(seconds, timestamps, writes))
+    report = {
+        "can_writes_per_s_mean": (writes[-1] - writes[0]) / duration,
+        "can_writes_per_s_max": per_second.max() if len(per_second) else math.nan,
+    }
+    if SUPPRESSED_WRITES in signals:
+        suppressed = signals[SUPPRESSED_WRITES].values
+        total = (writes[-1] - writes[0]) + (suppressed[-1] - suppressed[0])
+        report["can_suppressed_fraction"] = (
+            (suppressed[-1] - suppressed[0]) / total if total else math.nan
+        )
+    return report
+
+
+def plot(name: str, signals: Dict[str, Signal], directory: str) -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    figure, (loop_axes, steer_axes, velocity_axes) = plt.subplots(1, 3, figsize=(15, 4))
+    if LOOP_TIME in signals:
+        loop_axes.hist(signals[LOOP_TIME].values, bins=100)
+    loop_axes.set(title="loop time", xlabel="ms")
+    for module in MODULES:
+        if f"Modules/{module} Desired Angle" in signals:
+            steer_axes.hist(steering_errors(signals, module), bins=100, alpha=0.5)
+            velocity_axes.hist(velocity_errors(signals, module), bins=100, alpha=0.5)
+    steer_axes.set(title="steering error", xlabel="degrees")
+    velocity_axes.set(title="drive velocity error", xlabel="m/s")
+    figure.suptitle(name)
+    figure.tight_layout()
+    figure.savefig(os.path.join(directory, f"{name}.png"))
+    plt.close(figure)
+
+
+def analyze(
+    name: str, paths: Sequence[str], plot_directory: Optional[str] = None
+) -> Dict[str, float]:
+    """one row of the summary table"""
+    signals = load_log(paths)
+    row: Dict[str, float] = {}
+    for report in (loop_time_report, module_report, vision_report, can_write_report):
+        row.update(report(signals))
+    if plot_directory is not None:
+        plot(name, signals, plot_directory)
+    return row
+
+
+def group_segments(paths: Sequence[str]) -> Dict[str, List[str]]:
+    """log files (or directories of them) grouped into recordings"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith((".wpilog", ".wpilog.gz"))
+            )
+        else:
+            files.append(path)
+
+    recordings: Dict[str, List[str]] = {}
+    for path in sorted(files):
+        match = SEGMENT_NAME.match(os.path.basename(path))
+        name = match.group(1) if match else os.path.basename(path)
+        recordings.setdefault(name, []).append(path)
+    return recordings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="summarize recorded .wpilog files: loop times, steering and "
+        "velocity tracking, vision residuals and CAN write rates"
+    )
+    parser.add_argument("logs", nargs="+", help="log files or directories of them")
+    parser.add_argument("-o", "--output", default="log_summary.csv")
+    parser.add_argument("--plots", help="directory to save a figure per log in")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    recordings = group_segments(args.logs)
+    if not recordings:
+        parser.error("no .wpilog files found")
+    if args.plots is not None:
+        try:
+            import matplotlib  # noqa: F401
+        except ImportError:
+            parser.error("--plots needs matplotlib")
+        os.makedirs(args.plots, exist_ok=True)
+
+    with ProcessPoolExecutor(
+        max_workers=min(args.workers, len(recordings)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        rows = list(
+            executor.map(
+                analyze,
+                recordings.keys(),
+                recordings.values(),
+                [args.plots] * len(recordings),
+            )
+        )
+
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    with open(args.output, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["log", *columns])
+        for name, row in zip(recordings, rows):
+            writer.writerow(
+                [
+                    name,
+                    *(
+                        f"{row[column]:.6g}" if column in row else ""
+                        for column in columns
+                    ),
+                ]
+            )
+    print(f"wrote {len(rows)} logs to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import math
+import sys
+from time import perf_counter
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+from wpilib.simulation import DriverStationSim
+
+from constants import Constants, SwerveConstants
+from sim.HeadlessRunner import AUTONOMOUS, DISABLED, TELEOP, TEST, HeadlessRunner
+from sim.LogAnalyzer import Signal, group_segments, load_log
+from subsystems.Gyro import GyroSnapshot
+from subsystems.SwerveModule import SwerveModuleSnapshot
+from util.LoopTimer import loop_timer
+
+# the runner's mode for every value of the logged Mode channel
+RUNNER_MODES = (DISABLED, AUTONOMOUS, TELEOP, TEST)
+
+# outputs that have to match the log, the pose only differs within a loop
+# because the log only has the last of the odometry thread's samples per loop
+CHECKED_SIGNALS = (
+    "Desired Speed",
+    "Desired Angle",
+    "Drive Output",
+    "Turn Output",
+    "Drive Setpoint",
+    "Turn Setpoint",
+)
+# with onboard control these come from the motor controllers, not the code
+APPLIED_OUTPUTS = ("Drive Output", "Turn Output")
+ANGLE_SIGNALS = ("Desired Angle", "Turn Setpoint")
+
+
+class Difference(NamedTuple):
+    name: str
+    max_error: float
+    # loops off by more than the tolerance, and the first of them (-1 for none)
+    diverged: int
+    first_loop: int
+    checked: bool
+
+
+def aligned(signal: Signal, timestamps: np.ndarray) -> np.ndarray:
+    """a signal's value in every logged loop, nan before it was first recorded"""
+    indices = np.minimum(
+        np.searchsorted(signal.timestamps, timestamps), len(signal.timestamps) - 1
+    )
+    return np.where(
+        signal.timestamps[indices] == timestamps, signal.values[indices], math.nan
+    )
+
+
+def compare(
+    name: str,
+    logged: np.ndarray,
+    replayed: np.ndarray,
+    tolerance: float,
+    angle: bool = False,
+    checked: bool = True,
+) -> Difference:
+    error = replayed - logged
+    if angle:
+        error = np.remainder(error + math.pi, 2 * math.pi) - math.pi
+    # the motor outputs are nan until their first write
+    error = np.where(np.isnan(logged) & np.isnan(replayed), 0, np.abs(error))
+    error = np.nan_to_num(error, nan=math.inf)
+    diverged = np.flatnonzero(error > tolerance)
+    return Difference(
+        name,
+        float(error.max()) if len(error) else 0.0,
+        len(diverged),
+        int(diverged[0]) if len(diverged) else -1,
+        checked,
+    )
+
+
+class LogReplay:
+    """
+    Runs the robot code through the headless simulation again with the inputs
+    and sensors of a recorded match, one logged loop per simulated loop and
+    as far apart in simulated time as the logged loops were. Driver
+    inputs and the mode go through the simulated DriverStation, the gyro and
+    module reads are served from the log, and every loop's outputs are kept
+    to diff against the logged ones.
+    """
+
+    def __init__(self, signals: Dict[str, Signal]) -> None:
+        from RobotContainer import GYRO_SIGNALS, MODULE_NAMES, MODULE_SIGNALS
+
+        self.timestamps = signals["Mode"].timestamps
+        self.modes = signals["Mode"].values.astype(int)
+        self.inputs = {
+            name[len("Inputs/") :]: aligned(signal, self.timestamps)
+            for name, signal in signals.items()
+            if name.startswith("Inputs/")
+        }
+        self.gyro = np.column_stack(
+            [
+                aligned(signals[f"Gyro/{signal}"], self.timestamps)
+                for signal in GYRO_SIGNALS
+            ]
+        )
+        self.module_names = MODULE_NAMES
+        self.module_signals = MODULE_SIGNALS
+        # loops x modules x signals
+        self.modules = np.stack(
+            [
+                np.column_stack(
+                    [
+                        aligned(signals[f"Modules/{module} {signal}"], self.timestamps)
+                        for signal in MODULE_SIGNALS
+                    ]
+                )
+                for module in MODULE_NAMES
+            ],
+            axis=1,
+        )
+        self.poses = np.column_stack(
+            [
+                aligned(signals[name], self.timestamps)
+                for name in ("Pose/X", "Pose/Y", "Pose/Heading")
+            ]
+        )
+
+        self.loop = 0
+        self.replayed_modules = np.full_like(self.modules, math.nan)
+        self.replayed_poses = np.full_like(self.poses, math.nan)
+
+    def read_gyro(self, timestamp: float) -> GyroSnapshot:
+        return GyroSnapshot(timestamp, *self.gyro[self.loop].tolist())
+
+    def read_module(self, module: int, timestamp: float) -> SwerveModuleSnapshot:
+        drive_position, drive_velocity, turn_angle = self.modules[
+            self.loop, module, :3
+        ].tolist()
+        return SwerveModuleSnapshot(
+            timestamp, drive_position, drive_velocity, turn_angle
+        )
+
+    def set_inputs(self, now: float, period: float) -> None:
+        """a step callback, puts this loop's driver inputs on the DriverStation"""
+        for name, values in self.inputs.items():
+            port, kind = name.split("/")
+            kind, index = kind.rsplit(" ", 1)
+            value = values[self.loop]
+            if math.isnan(value):
+                continue
+            if kind == "Axis":
+                DriverStationSim.setJoystickAxis(int(port), int(index), value)
+            elif kind == "Button":
+                DriverStationSim.setJoystickButton(int(port), int(index), value > 0)
+            else:
+                DriverStationSim.setJoystickPOV(int(port), int(index), int(value))
+
+    def run(self) -> float:
+        """replays every logged loop, returns the wall time it took"""
+        # one deterministic sample per loop instead of the odometry thread,
+        # and nothing written to disk while replaying
+        SwerveConstants.kOdometryFrequencyHz = 0
+        Constants.datalog_enabled = False
+
+        # every loop is run by the runner with its logged delta, the robot's
+        # own loop never starts
+        runner = HeadlessRunner(run_loop=True)
+        runner.start()
+        try:
+            swerve_subsystem = runner.robot.robot_container.swerve_subsystem
+            # the hardware reads are the seam, sample() latches what they return
+            swerve_subsystem.gyro.read = self.read_gyro
+            for i, module in enumerate(swerve_subsystem.modules):
+                module.read = lambda timestamp, i=i: self.read_module(i, timestamp)
+
+            ports = {int(name.split("/")[0]) for name in self.inputs}
+            for port in ports:
+                DriverStationSim.setJoystickAxisCount(port, 12)
+                DriverStationSim.setJoystickButtonCount(port, 32)
+                DriverStationSim.setJoystickPOVCount(port, 12)
+            runner.step_callbacks.insert(0, self.set_inputs)
+
+            # the time between the recorded loops, which jitters on a real robot
+            # and feeds the slew rate limiters and the motor output keep alive
+            deltas = np.diff(
+                self.timestamps, prepend=self.timestamps[0] - Constants.period
+            )
+            start = perf_counter()
+            for loop, delta in enumerate(deltas.tolist()):
+                self.loop = loop
+                mode = RUNNER_MODES[self.modes[loop]]
+                runner.set_mode(mode)
+                runner.step(mode, delta)
+                self.record(swerve_subsystem)
+            return perf_counter() - start
+        finally:
+            runner.stop()
+
+    def record(self, swerve_subsystem) -> None:
+        for i, module in enumerate(swerve_subsystem.modules):
+            self.replayed_modules[self.loop, i, 3:] = (
+                module.desired_speed,
+                module.desired_angle,
+                *module.get_applied_outputs(),
+                *module.get_setpoints(),
+            )
+        pose = swerve_subsystem.get_pose()
+        self.replayed_poses[self.loop] = (
+            pose.X(),
+            pose.Y(),
+            pose.rotation().radians(),
+        )
+
+    def diff(self, tolerance: float) -> List[Difference]:
+        differences = []
+        for i, module in enumerate(self.module_names):
+            for j, signal in enumerate(self.module_signals):
+                if signal in CHECKED_SIGNALS:
+                    differences.append(
+                        compare(
+                            f"{module} {signal}",
+                            self.modules[:, i, j],
+                            self.replayed_modules[:, i, j],
+                            tolerance,
+                            angle=signal in ANGLE_SIGNALS,
+                            checked=not (
+                                SwerveConstants.kOnboardControl
+                                and signal in APPLIED_OUTPUTS
+                            ),
+                        )
+                    )
+        for j, name in enumerate(("Pose X", "Pose Y", "Pose Heading")):
+            differences.append(
+                compare(
+                    name,
+                    self.poses[:, j],
+                    self.replayed_poses[:, j],
+                    tolerance,
+                    angle=j == 2,
+                    checked=False,
+                )
+            )
+        return differences
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="run the robot code on the inputs and sensors of a recorded "
+        "match and diff its outputs against the recorded ones, fails when a "
+        "motor output differs by more than --tolerance"
+    )
+    parser.add_argument(
+        "logs", nargs="+", help="the .wpilog and .wpilog.gz segments of one match"
+    )
+    parser.add_argument("--tolerance", type=float, default=1e-6)
+    args = parser.parse_args()
+
+    recordings = group_segments(args.logs)
+    if len(recordings) != 1:
+        parser.error(f"expected one recording, got {', '.join(recordings) or 'none'}")
+    try:
+        replay = LogReplay(load_log(*recordings.values()))
+    except KeyError as e:
+        parser.error(f"the log has no {e} channel, it was recorded before replays")
+    wall_time = replay.run()
+
+    loops = len(replay.timestamps)
+    match_time = replay.timestamps[-1] - replay.timestamps[0] + Constants.period
+    print(
+        f"replayed {loops} loops ({match_time:.1f} s) in {wall_time:.2f} s "
+        f"({match_time / max(wall_time, 1e-9):.1f}x real time)"
+    )
+    p50, p95, p99, worst = loop_timer.get_buffer("Robot.robotPeriodic").percentiles()
+    print(
+        f"robotPeriodic  p50 {p50 * 1000:.3f}  p95 {p95 * 1000:.3f}  "
+        f"p99 {p99 * 1000:.3f}  max {worst * 1000:.3f} ms"
+    )
+
+    failed = False
+    for difference in replay.diff(args.tolerance):
+        failed |= difference.checked and difference.diverged > 0
+        print(
+            f"{difference.name:22} max error {difference.max_error:10.3g}  "
+            f"{difference.diverged:6} loops off"
+            + (
+                f", first at loop {difference.first_loop}"
+                if difference.diverged
+                else ""
+            )
+            + ("" if difference.checked else "  (not checked)")
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
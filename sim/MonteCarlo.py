@@ -0,0 +1,206 @@
+import argparse
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from constants import AutoConstants, PhysicsConstants
+
+
+class Disturbances(NamedTuple):
+    """how far each randomized parameter may stray from ideal"""
+
+    # fraction the wheel friction of each module can drop by
+    wheel_slip: float = 0.3
+    gyro_noise_deg: float = 0.5
+    # volts the battery can sag by
+    battery_sag: float = 1.5
+    # standard deviations of the start pose error
+    start_error_m: float = 0.05
+    start_error_deg: float = 2.0
+
+
+class RunResult(NamedTuple):
+    seed: int
+    # distance and heading from the true final pose to the trajectory's end
+    final_error_m: float
+    final_heading_error_deg: float
+    # distance from the odometry's final pose to the true one, mostly wheel slip
+    odometry_error_m: float
+    # nan if the routine didn't finish within the auto period
+    completion_time: float
+
+
+def run_once(
+    seed: int, routine: str, disturbances: Disturbances, auto_time: float
+) -> RunResult:
+    """
+    One run of an auto routine, picked on the chooser like from the dashboard,
+    in a fresh process, the HAL can't be reset in between. The routine has to
+    follow the trajectory of the same name, its end is what the run is scored
+    against.
+    """
+    # imported here so the parent process never initializes the HAL
+    from wpilib import SmartDashboard
+    from wpimath.geometry import Pose2d, Rotation2d
+
+    from physics import PhysicsParams
+    from sim.HeadlessRunner import AUTONOMOUS, DISABLED, HeadlessRunner
+
+    rng = np.random.default_rng(seed)
+    params = PhysicsParams(
+        battery_voltage=PhysicsConstants.battery_voltage
+        - rng.uniform(0, disturbances.battery_sag),
+        wheel_friction_coefficients=(
+            PhysicsConstants.wheel_friction_coefficient
+            * (1 - rng.uniform(0, disturbances.wheel_slip, 4))
+        ).tolist(),
+        gyro_noise_deg=disturbances.gyro_noise_deg,
+        seed=seed,
+    )
+
+    runner = HeadlessRunner(physics_params=params)
+    runner.start()
+    try:
+        robot_container = runner.robot.robot_container
+        if routine not in robot_container.auto_registry.factories:
+            raise ValueError(f"no auto routine {routine}")
+        if routine not in robot_container.trajectories:
+            raise ValueError(f"auto routine {routine} doesn't follow a trajectory")
+        SmartDashboard.putString("Auto Routine/selected", routine)
+
+        # disabledInit builds the auto routines
+        runner.set_mode(DISABLED)
+        runner.step(DISABLED)
+
+        trajectory = robot_container.trajectories[routine]
+        start = trajectory.initialPose()
+        runner.physics.reset_pose(
+            Pose2d(
+                start.X() + rng.normal(0, disturbances.start_error_m),
+                start.Y() + rng.normal(0, disturbances.start_error_m),
+                start.rotation()
+                + Rotation2d.fromDegrees(rng.normal(0, disturbances.start_error_deg)),
+            )
+        )
+
+        runner.set_mode(AUTONOMOUS)
+        completion_time = math.nan
+        steps = round(auto_time / runner.period)
+        for step in range(steps):
+            runner.step(AUTONOMOUS)
+            if step == 0 and routine not in robot_container.auto_registry.used:
+                raise RuntimeError(f"the chooser didn't run auto routine {routine}")
+            command = runner.robot.auto_command
+            if step > 0 and command is not None and not command.isScheduled():
+                completion_time = (step + 1) * runner.period
+                break
+
+        end = trajectory.sample(trajectory.totalTime()).pose
+        final = runner.physics.get_pose()
+        odometry = robot_container.swerve_subsystem.get_pose()
+        return RunResult(
+            seed,
+            final.translation().distance(end.translation()),
+            abs((final.rotation() - end.rotation()).degrees()),
+            odometry.translation().distance(final.translation()),
+            completion_time,
+        )
+    finally:
+        runner.stop()
+
+
+def percentiles(values: np.ndarray) -> str:
+    if len(values) == 0:
+        return "no data"
+    p50, p95 = np.percentile(values, (50, 95))
+    return (
+        f"mean {values.mean():.3f}  std {values.std():.3f}  "
+        f"p50 {p50:.3f}  p95 {p95:.3f}  max {values.max():.3f}"
+    )
+
+
+def evaluate(
+    runs: int,
+    routine: str,
+    disturbances: Disturbances = Disturbances(),
+    auto_time: float = 15.0,
+    workers: Optional[int] = None,
+    first_seed: int = 0,
+) -> List[RunResult]:
+    # spawn and a single task per process give every run its own HAL
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = [
+            executor.submit(run_once, seed, routine, disturbances, auto_time)
+            for seed in range(first_seed, first_seed + runs)
+        ]
+        return [future.result() for future in futures]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="evaluate an autonomous routine under randomized disturbances"
+    )
+    parser.add_argument("-n", "--runs", type=int, default=200)
+    parser.add_argument(
+        "--routine",
+        default=next(iter(AutoConstants.trajectories)),
+        help="an auto routine that follows the trajectory of the same name",
+    )
+    parser.add_argument("--workers", type=int, help="defaults to the cpu count")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run")
+    parser.add_argument("--auto-time", type=float, default=15.0)
+    parser.add_argument("--wheel-slip", type=float, default=Disturbances.wheel_slip)
+    parser.add_argument("--gyro-noise", type=float, default=Disturbances.gyro_noise_deg)
+    parser.add_argument("--battery-sag", type=float, default=Disturbances.battery_sag)
+    parser.add_argument("--start-error", type=float, default=Disturbances.start_error_m)
+    parser.add_argument(
+        "--start-error-deg", type=float, default=Disturbances.start_error_deg
+    )
+    args = parser.parse_args()
+
+    disturbances = Disturbances(
+        args.wheel_slip,
+        args.gyro_noise,
+        args.battery_sag,
+        args.start_error,
+        args.start_error_deg,
+    )
+
+    start = perf_counter()
+    results = evaluate(
+        args.runs,
+        args.routine,
+        disturbances,
+        args.auto_time,
+        args.workers,
+        args.seed,
+    )
+    elapsed = perf_counter() - start
+
+    final_errors = np.array([result.final_error_m for result in results])
+    heading_errors = np.array([result.final_heading_error_deg for result in results])
+    odometry_errors = np.array([result.odometry_error_m for result in results])
+    completion_times = np.array([result.completion_time for result in results])
+    completed = completion_times[~np.isnan(completion_times)]
+
+    print(f"{len(results)} runs of {args.routine} in {elapsed:.1f} s")
+    print(f"final error (m):     {percentiles(final_errors)}")
+    print(f"heading error (deg): {percentiles(heading_errors)}")
+    print(f"odometry drift (m):  {percentiles(odometry_errors)}")
+    print(f"completed:           {len(completed)}/{len(results)}")
+    print(f"completion time (s): {percentiles(completed)}")
+
+    worst = max(results, key=lambda result: result.final_error_m)
+    print(f"worst run: seed {worst.seed}, {worst.final_error_m:.3f} m")
+
+
+if __name__ == "__main__":
+    main()
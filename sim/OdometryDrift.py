@@ -0,0 +1,85 @@
+import argparse
+import math
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from wpilib.simulation import DriverStationSim
+
+from constants import Constants, SwerveConstants
+from sim.HeadlessRunner import TELEOP, HeadlessRunner
+
+# left stick x and y and right stick x, like the drive pipeline reads them
+DRIVE_X_AXIS = 0
+DRIVE_Y_AXIS = 1
+ROTATION_AXIS = 4
+
+# the physics writes the sensors at 200 Hz, as fast as the odometry thread runs
+SUBSTEPS = 4
+
+
+def measure_drift(
+    odometry_frequency: float, duration: float = 10.0, weave_period: float = 0.5
+) -> float:
+    """
+    Weave and spin in teleop and return how far in meters the odometry ended
+    up from where the simulated robot really is. 0 Hz samples the sensors
+    once per loop instead of on the odometry thread.
+    """
+    SwerveConstants.kOdometryFrequencyHz = odometry_frequency
+    port = Constants.pilot_controller_id
+    runner = HeadlessRunner(substeps=SUBSTEPS)
+    runner.start()
+    try:
+        DriverStationSim.setJoystickAxisCount(port, 6)
+        DriverStationSim.setJoystickButtonCount(port, 14)
+        DriverStationSim.setJoystickPOVCount(port, 1)
+        runner.set_mode(TELEOP)
+
+        # turn and change direction every weave_period, where sampling once
+        # per loop integrates the module angles and speeds the coarsest
+        steps = round(duration / runner.period)
+        for step in range(steps):
+            phase = step * runner.period / weave_period * math.tau
+            DriverStationSim.setJoystickAxis(port, DRIVE_X_AXIS, 1.0)
+            DriverStationSim.setJoystickAxis(port, DRIVE_Y_AXIS, math.sin(phase))
+            DriverStationSim.setJoystickAxis(port, ROTATION_AXIS, math.cos(phase))
+            runner.step(TELEOP)
+
+        pose = runner.robot.robot_container.swerve_subsystem.get_pose()
+        true_pose = runner.physics.get_pose()
+    finally:
+        runner.stop()
+
+    return pose.translation().distance(true_pose.translation())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="compare the odometry drift of sampling once per loop against "
+        "the odometry thread in the simulator, fails when a faster odometry "
+        "frequency drifts more"
+    )
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--frequencies", type=float, nargs="+", default=(0.0, 200.0))
+    args = parser.parse_args()
+
+    frequencies = sorted(args.frequencies)
+    # a fresh process per run, the HAL can't be reset in between
+    with ProcessPoolExecutor(
+        max_workers=len(frequencies),
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        drifts = list(
+            executor.map(measure_drift, frequencies, [args.duration] * len(frequencies))
+        )
+
+    for frequency, drift in zip(frequencies, drifts):
+        print(f"{frequency:6.0f} Hz  drift {drift * 100:.2f} cm")
+
+    sys.exit(0 if drifts == sorted(drifts, reverse=True) else 1)
+
+
+if __name__ == "__main__":
+    main()
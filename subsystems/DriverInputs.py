@@ -0,0 +1,99 @@
+from time import perf_counter
+from typing import List, Sequence
+
+import numpy as np
+from commands2.button import Trigger
+from wpilib import DriverStation
+
+
+class DriverInputs:
+    """
+    Every axis, button and POV of the configured controllers, read from the
+    DriverStation once per loop into one flat array so everything in a loop
+    sees the same inputs. Per controller the array holds its axes, then its
+    buttons (1.0 when held) and then its POVs (degrees, -1 when released).
+    """
+
+    # the most the driver station sends per controller
+    max_axes = 12
+    max_buttons = 32
+    max_povs = 12
+    stride = max_axes + max_buttons + max_povs
+
+    def __init__(self, ports: Sequence[int]) -> None:
+        # the same controller can be configured twice, e.g. pilot and copilot
+        self.ports = tuple(dict.fromkeys(ports))
+        self.offsets = {port: i * self.stride for i, port in enumerate(self.ports)}
+
+        self.values = np.zeros(len(self.ports) * self.stride)
+        # the values of the loop before, for pressed and released edges
+        self.previous_values = np.zeros(len(self.ports) * self.stride)
+        # every POV of every controller is released until the first sample
+        self.values.reshape(len(self.ports), self.stride)[
+            :, self.max_axes + self.max_buttons :
+        ] = -1
+        np.copyto(self.previous_values, self.values)
+
+        # FPGA timestamp the inputs were read at, and the perf_counter time that
+        # is carried down to the motor outputs to measure their latency
+        self.timestamp = 0.0
+        self.read_time = -1.0
+
+    def sample(self, timestamp: float) -> None:
+        """read every input once, the getters use these values until the next sample"""
+        np.copyto(self.previous_values, self.values)
+        self.read_time = perf_counter()
+        values = self.values
+        for port, offset in self.offsets.items():
+            axis_count = DriverStation.getStickAxisCount(port)
+            button_count = DriverStation.getStickButtonCount(port)
+            pov_count = DriverStation.getStickPOVCount(port)
+
+            for axis in range(axis_count):
+                values[offset + axis] = DriverStation.getStickAxis(port, axis)
+            values[offset + axis_count : offset + self.max_axes] = 0
+
+            offset += self.max_axes
+            for button in range(button_count):
+                # wpilib numbers buttons from 1
+                values[offset + button] = DriverStation.getStickButton(port, button + 1)
+            values[offset + button_count : offset + self.max_buttons] = 0
+
+            offset += self.max_buttons
+            for pov in range(pov_count):
+                values[offset + pov] = DriverStation.getStickPOV(port, pov)
+            values[offset + pov_count : offset + self.max_povs] = -1
+
+        self.timestamp = timestamp
+
+    def names(self) -> List[str]:
+        """a name for every value, in the order of the array"""
+        return [
+            f"{port}/{name}"
+            for port in self.ports
+            for name in (
+                *(f"Axis {axis}" for axis in range(self.max_axes)),
+                *(f"Button {button + 1}" for button in range(self.max_buttons)),
+                *(f"POV {pov}" for pov in range(self.max_povs)),
+            )
+        ]
+
+    def get_axis(self, port: int, axis: int) -> float:
+        return self.values.item(self.offsets[port] + axis)
+
+    def get_button(self, port: int, button: int) -> bool:
+        """whether a button, numbered from 1 like wpilib, is held"""
+        return self.values.item(self.offsets[port] + self.max_axes + button - 1) > 0
+
+    def get_button_pressed(self, port: int, button: int) -> bool:
+        """whether a button went down since the last sample"""
+        index = self.offsets[port] + self.max_axes + button - 1
+        return self.values.item(index) > 0 and self.previous_values.item(index) == 0
+
+    def get_pov(self, port: int, pov: int = 0) -> int:
+        index = self.offsets[port] + self.max_axes + self.max_buttons + pov
+        return int(self.values.item(index))
+
+    def button(self, port: int, button: int) -> Trigger:
+        """a trigger for command bindings that reads the sampled button"""
+        return Trigger(lambda: self.get_button(port, button))
@@ -0,0 +1,76 @@
+from typing import NamedTuple
+from wpilib import SPI
+from wpimath.geometry import Rotation2d
+from navx import AHRS
+
+from constants import SwerveConstants
+
+
+class GyroSnapshot(NamedTuple):
+    """
+    gyro angles in degrees (rate in deg/s), sampled once at `timestamp`.
+    Yaw is counterclockwise positive like wpimath, the navX is clockwise
+    positive (see SwerveConstants.kGyroInverted).
+    """
+
+    timestamp: float
+    yaw: float
+    yaw_rate: float
+    pitch: float
+    roll: float
+
+
+class Gyro:
+    # the fastest the navX sends new data
+    max_update_rate_hz = 200
+    # values every read() gets from the navX
+    reads_per_sample = 4
+
+    def __init__(self, port: SPI.Port, update_rate_hz: int) -> None:
+        self.ahrs = AHRS(port, min(update_rate_hz, self.max_update_rate_hz))
+        self.yaw_sign = -1.0 if SwerveConstants.kGyroInverted else 1.0
+
+        # number of reads that went out to the navX from sample(), on the main
+        # loop, the odometry thread counts its own
+        self.hardware_reads = 0
+
+        self.snapshot = GyroSnapshot(0.0, 0.0, 0.0, 0.0, 0.0)
+        self.rotation2d = Rotation2d(0)
+
+    def read(self, timestamp: float) -> GyroSnapshot:
+        """read every gyro value from the hardware"""
+        return GyroSnapshot(
+            timestamp,
+            self.yaw_sign * self.ahrs.getYaw(),
+            self.yaw_sign * self.ahrs.getRate(),
+            self.ahrs.getPitch(),
+            self.ahrs.getRoll(),
+        )
+
+    def sample(self, timestamp: float) -> GyroSnapshot:
+        """read the gyro once, the getters use this until the next sample"""
+        self.hardware_reads += self.reads_per_sample
+        self.latch(self.read(timestamp))
+        return self.snapshot
+
+    def latch(self, snapshot: GyroSnapshot) -> None:
+        self.snapshot = snapshot
+        self.rotation2d = Rotation2d.fromDegrees(snapshot.yaw)
+
+    def reset(self) -> None:
+        self.ahrs.reset()
+
+    def get_yaw(self) -> float:
+        return self.snapshot.yaw
+
+    def get_yaw_rate(self) -> float:
+        return self.snapshot.yaw_rate
+
+    def get_pitch(self) -> float:
+        return self.snapshot.pitch
+
+    def get_roll(self) -> float:
+        return self.snapshot.roll
+
+    def get_rotation2d(self) -> Rotation2d:
+        return self.rotation2d
@@ -0,0 +1,55 @@
+import math
+from typing import Callable
+
+from wpilib import Timer
+
+from constants import Constants
+
+
+class MotorOutput:
+    """
+    Only sends a motor command over CAN when it differs from the last one by
+    more than `epsilon`, or when `keep_alive` seconds passed since the last
+    write so a lost frame can't leave the motor on a stale command.
+    `write` sends a command, e.g. `motor.set` or a closed loop setpoint.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[float], None],
+        epsilon: float = Constants.motor_output_epsilon,
+        keep_alive: float = Constants.motor_output_keep_alive,
+    ) -> None:
+        self.write = write
+        self.epsilon = epsilon
+        self.keep_alive = keep_alive
+
+        # nan so the first command is always written
+        self.value = math.nan
+        self.written_at = -math.inf
+
+        self.writes = 0
+        self.suppressed_writes = 0
+
+    def set(self, value: float) -> None:
+        now = Timer.getFPGATimestamp()
+        if (
+            abs(value - self.value) <= self.epsilon
+            and now - self.written_at < self.keep_alive
+        ):
+            self.suppressed_writes += 1
+            return
+
+        self.write(value)
+        self.value = value
+        self.written_at = now
+        self.writes += 1
+
+    def reset(self) -> None:
+        """always write the next command, e.g. after the motor was set directly"""
+        self.value = math.nan
+        self.written_at = -math.inf
+
+    def get(self) -> float:
+        """the last command written"""
+        return self.value
@@ -0,0 +1,68 @@
+import threading
+from collections import deque
+from typing import Deque, List, NamedTuple, Sequence, Tuple
+from wpilib import Notifier, Timer
+
+from .Gyro import Gyro, GyroSnapshot
+from .SwerveModule import SwerveModule, SwerveModuleSnapshot
+
+
+class OdometrySample(NamedTuple):
+    gyro: GyroSnapshot
+    modules: Tuple[SwerveModuleSnapshot, ...]
+
+
+class OdometryThread:
+    """
+    Samples the gyro and the modules on a Notifier, faster than the main loop.
+    The main loop drains the queued samples into the odometer once per loop.
+    """
+
+    def __init__(
+        self,
+        gyro: Gyro,
+        modules: Sequence[SwerveModule],
+        frequency: float,
+        capacity: int = 64,
+    ) -> None:
+        self.gyro = gyro
+        self.modules = tuple(modules)
+        self.period = 1 / frequency
+
+        self.lock = threading.Lock()
+        # drops the oldest samples if the main loop stalls
+        self.samples: Deque[OdometrySample] = deque(maxlen=capacity)
+        # hardware reads of every sample, guarded by the lock like the queue
+        self.hardware_reads = 0
+        self.reads_per_sample = gyro.reads_per_sample + sum(
+            module.reads_per_sample for module in self.modules
+        )
+        # hardware_reads as of the last drain, only touched by the main loop
+        self.drained_hardware_reads = 0
+
+        self.notifier = Notifier(self.sample)
+        self.notifier.setName("Odometry")
+
+    def start(self) -> None:
+        self.notifier.startPeriodic(self.period)
+
+    def stop(self) -> None:
+        self.notifier.stop()
+
+    def sample(self) -> None:
+        timestamp = Timer.getFPGATimestamp()
+        sample = OdometrySample(
+            self.gyro.read(timestamp),
+            tuple(module.read(timestamp) for module in self.modules),
+        )
+        with self.lock:
+            self.samples.append(sample)
+            self.hardware_reads += self.reads_per_sample
+
+    def drain(self) -> List[OdometrySample]:
+        """every sample since the last drain, oldest first"""
+        with self.lock:
+            samples = list(self.samples)
+            self.samples.clear()
+            self.drained_hardware_reads = self.hardware_reads
+        return samples
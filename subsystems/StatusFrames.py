@@ -0,0 +1,166 @@
+import logging
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import ctre
+import rev
+
+from constants import Constants, SwerveConstants
+
+logger = logging.getLogger("startup")
+
+
+def odometry_ms() -> int:
+    """the period the odometry reads its signals at, as currently configured"""
+    return round(
+        1000 / SwerveConstants.kOdometryFrequencyHz
+        if SwerveConstants.kOdometryFrequencyHz > 0
+        else Constants.period * 1000
+    )
+
+
+class StatusFrame(NamedTuple):
+    frame: object
+    # the device's own period and the one configured here, None follows the
+    # odometry so its signals arrive at least as often as they're read
+    default_ms: int
+    period_ms: Optional[int]
+    # what the code reads from this frame, nothing means it's only slowed down
+    signals: Tuple[str, ...] = ()
+
+    def period(self) -> int:
+        return odometry_ms() if self.period_ms is None else self.period_ms
+
+
+class DeviceProfile(NamedTuple):
+    """which status frames a kind of device sends and how often"""
+
+    name: str
+    frames: Tuple[StatusFrame, ...]
+    # commands sent from the roboRIO to the device
+    control_period_ms: int
+
+
+# as slow as both vendors allow for frames nothing reads
+slow_ms = 255
+
+SPARK_MAX_TURN = DeviceProfile(
+    "SparkMax turn",
+    (
+        StatusFrame(rev.CANSparkMaxLowLevel.PeriodicFrame.kStatus0, 10, 100),
+        StatusFrame(rev.CANSparkMaxLowLevel.PeriodicFrame.kStatus1, 20, slow_ms),
+        StatusFrame(rev.CANSparkMaxLowLevel.PeriodicFrame.kStatus2, 20, slow_ms),
+        StatusFrame(rev.CANSparkMaxLowLevel.PeriodicFrame.kStatus3, 50, slow_ms),
+        StatusFrame(rev.CANSparkMaxLowLevel.PeriodicFrame.kStatus4, 20, slow_ms),
+        StatusFrame(
+            rev.CANSparkMaxLowLevel.PeriodicFrame.kStatus5,
+            200,
+            None,
+            ("absolute encoder position",),
+        ),
+        StatusFrame(rev.CANSparkMaxLowLevel.PeriodicFrame.kStatus6, 200, slow_ms),
+    ),
+    control_period_ms=20,
+)
+
+TALON_FX_DRIVE = DeviceProfile(
+    "TalonFX drive",
+    (
+        StatusFrame(ctre.StatusFrameEnhanced.Status_1_General, 10, 100),
+        StatusFrame(
+            ctre.StatusFrameEnhanced.Status_2_Feedback0,
+            20,
+            None,
+            ("selected sensor position", "selected sensor velocity"),
+        ),
+        StatusFrame(ctre.StatusFrameEnhanced.Status_4_AinTempVbat, 160, slow_ms),
+        StatusFrame(ctre.StatusFrameEnhanced.Status_10_Targets, 160, slow_ms),
+        StatusFrame(ctre.StatusFrameEnhanced.Status_12_Feedback1, 160, slow_ms),
+        StatusFrame(ctre.StatusFrameEnhanced.Status_13_Base_PIDF0, 160, slow_ms),
+        StatusFrame(ctre.StatusFrameEnhanced.Status_14_Turn_PIDF1, 160, slow_ms),
+        StatusFrame(
+            ctre.StatusFrameEnhanced.Status_21_FeedbackIntegrated, 160, slow_ms
+        ),
+        StatusFrame(ctre.StatusFrameEnhanced.Status_Brushless_Current, 50, slow_ms),
+    ),
+    control_period_ms=10,
+)
+
+
+def apply_spark_max(motor: rev.CANSparkMax, profile: DeviceProfile) -> None:
+    for status_frame in profile.frames:
+        error = motor.setPeriodicFramePeriod(status_frame.frame, status_frame.period())
+        if error != rev.REVLibError.kOk:
+            logger.warning(
+                "%s %d: setting %s failed with %s",
+                profile.name,
+                motor.getDeviceId(),
+                status_frame.frame,
+                error,
+            )
+
+
+def apply_talon_fx(
+    motor: ctre.WPI_TalonFX, profile: DeviceProfile, timeout_ms: int = 50
+) -> None:
+    for status_frame in profile.frames:
+        error = motor.setStatusFramePeriod(
+            status_frame.frame, status_frame.period(), timeout_ms
+        )
+        if error != ctre.ErrorCode.OK:
+            logger.warning(
+                "%s %d: setting %s failed with %s",
+                profile.name,
+                motor.getDeviceID(),
+                status_frame.frame,
+                error,
+            )
+
+
+def frames_per_second(profile: DeviceProfile, default: bool = False) -> float:
+    periods = [
+        status_frame.default_ms if default else status_frame.period()
+        for status_frame in profile.frames
+    ]
+    return sum(1000 / period for period in periods) + 1000 / profile.control_period_ms
+
+
+def estimate_bus_load(
+    profiles: Iterable[DeviceProfile], default: bool = False
+) -> float:
+    """
+    Expected fraction of the CAN bus used by the devices, one profile per
+    device. Every frame is counted as a full 8 byte frame with an extended id.
+    """
+    bits_per_second = sum(
+        frames_per_second(profile, default) * Constants.can_bits_per_frame
+        for profile in profiles
+    )
+    return bits_per_second / Constants.can_bitrate
+
+
+# one of each per swerve module
+SWERVE_PROFILES = (TALON_FX_DRIVE, SPARK_MAX_TURN) * 4
+
+
+def main() -> None:
+    for profile in (TALON_FX_DRIVE, SPARK_MAX_TURN):
+        print(f"{profile.name}:")
+        for status_frame in profile.frames:
+            signals = ", ".join(status_frame.signals) or "unused"
+            print(
+                f"  {str(status_frame.frame):48} {status_frame.default_ms:4} ms -> "
+                f"{status_frame.period():4} ms  {signals}"
+            )
+        print(
+            f"  {frames_per_second(profile, default=True):.0f} -> "
+            f"{frames_per_second(profile):.0f} frames/s"
+        )
+
+    print(
+        f"swerve bus load: {estimate_bus_load(SWERVE_PROFILES, default=True):.1%} "
+        f"with the default periods, {estimate_bus_load(SWERVE_PROFILES):.1%} configured"
+    )
+
+
+if __name__ == "__main__":
+    main()
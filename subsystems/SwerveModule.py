@@ -3,13 +3,50 @@ import ctre
 import wpilib as wp
 from wpimath.kinematics import SwerveModuleState, SwerveModulePosition
 from wpimath.geometry import Rotation2d
-from wpimath.controller import PIDController
+from wpimath.controller import (
+    ProfiledPIDControllerRadians,
+    SimpleMotorFeedforwardMeters,
+    SimpleMotorFeedforwardRadians,
+)
+from wpimath.trajectory import TrapezoidProfileRadians
 import math
+from typing import NamedTuple, Optional, Tuple
 
 from constants import SwerveConstants, Constants
+from .MotorOutput import MotorOutput
+from .StatusFrames import (
+    SPARK_MAX_TURN,
+    TALON_FX_DRIVE,
+    apply_spark_max,
+    apply_talon_fx,
+)
+from util.LatencyHistogram import input_latency
+
+
+def clamp_duty(volts: float) -> float:
+    """volts to a voltage compensated duty cycle"""
+    return min(max(volts / SwerveConstants.kNominalVoltage, -1.0), 1.0)
+
+
+class SwerveModuleSnapshot(NamedTuple):
+    """sensor values of a module, sampled once at `timestamp`"""
+
+    timestamp: float
+    drive_position: float
+    drive_velocity: float
+    turn_angle: float
+
+    def to_state(self) -> SwerveModuleState:
+        return SwerveModuleState(self.drive_velocity, Rotation2d(self.turn_angle))
+
+    def to_position(self) -> SwerveModulePosition:
+        return SwerveModulePosition(self.drive_position, Rotation2d(self.turn_angle))
 
 
 class SwerveModule:
+    # drive position, drive velocity and turn angle
+    reads_per_sample = 3
+
     # drive_motor: ctre.WPI_TalonFX
     # turn_motor: rev.CANSparkMax
 
@@ -29,7 +66,15 @@ class SwerveModule:
         abs_encoder_reversed=False,
         abs_encoder_offset_rad=0.0,
         period=0.02,
+        drive_feedforward: Tuple[float, float, float] = (
+            SwerveConstants.kDriveFeedforward[0]
+        ),
+        turn_feedforward: Tuple[float, float, float] = (
+            SwerveConstants.kTurnFeedforward[0]
+        ),
     ) -> None:
+        self.period = period
+
         # set angle offset
         self.abs_encoder_offset_rad = abs_encoder_offset_rad
         self.abs_encoder_reversed = abs_encoder_reversed
@@ -42,6 +87,22 @@ class SwerveModule:
         )
         self.turn_motor.setInverted(turn_motor_reversed)
 
+        # a duty cycle is the same voltage whatever the battery is at,
+        # so the feedforward volts map straight to duty cycles
+        self.drive_motor.configVoltageCompSaturation(SwerveConstants.kNominalVoltage)
+        self.drive_motor.enableVoltageCompensation(True)
+        self.turn_motor.enableVoltageCompensation(SwerveConstants.kNominalVoltage)
+
+        # only send the status frames the code reads at the rate it reads them
+        apply_talon_fx(self.drive_motor, TALON_FX_DRIVE)
+        apply_spark_max(self.turn_motor, SPARK_MAX_TURN)
+
+        # every command goes through these so unchanged ones aren't resent
+        self.drive_output = MotorOutput(self.drive_motor.set)
+        self.turn_output = MotorOutput(self.turn_motor.set)
+        # FPGA timestamp of the last characterization voltages, which bypass them
+        self.characterization_written_at = -math.inf
+
         # create encoders
         # self.abs_encoder = wp.AnalogInput(abs_encoder_id)
         # self.abs_encoder = wp.AnalogInput(abs_encoder_id)
@@ -58,17 +119,55 @@ class SwerveModule:
         #     SwerveConstants.kDriveEncoderRotToVelocityMps
         # )
         self.turn_encoder.setPositionConversionFactor(
-            SwerveConstants.kTurnEncoderRotToMeters
+            SwerveConstants.kTurnEncoderRotToRad
         )
-        self.turn_encoder.setPositionConversionFactor(
-            SwerveConstants.kTurnEncoderRotToVelocityMps
+        self.turn_encoder.setVelocityConversionFactor(
+            SwerveConstants.kTurnEncoderRpmToRadPerSecond
         )
 
-        self.turn_pid = PIDController(SwerveConstants.kPTurning, 0, 0, period)
+        self.drive_feedforward_gains = drive_feedforward
+        self.drive_feedforward = SimpleMotorFeedforwardMeters(*drive_feedforward)
+        self.turn_feedforward = SimpleMotorFeedforwardRadians(*turn_feedforward)
+
+        # the profile's velocity drives the steering feedforward
+        self.turn_pid = ProfiledPIDControllerRadians(
+            SwerveConstants.kPTurning,
+            SwerveConstants.kITurning,
+            SwerveConstants.kDTurning,
+            TrapezoidProfileRadians.Constraints(
+                SwerveConstants.kTurnMaxRadPerSecond,
+                SwerveConstants.kTurnMaxRadPerSecondSquared,
+            ),
+            period,
+        )
         self.turn_pid.enableContinuousInput(-math.pi, math.pi)
 
+        # last commanded speeds, for the feedforward accelerations
+        self.drive_setpoint = 0.0
+        self.turn_velocity_setpoint = 0.0
+
+        # last optimized state asked for, for telemetry
+        self.desired_speed = 0.0
+        self.desired_angle = 0.0
+
+        # last steering setpoint sent to the SparkMax in onboard control
+        self.turn_setpoint: Optional[float] = None
+        # and the last drive velocity setpoint sent to the TalonFX, in m/s
+        self.drive_velocity_setpoint: Optional[float] = None
+        self.onboard_control = SwerveConstants.kOnboardControl
+        if self.onboard_control:
+            self.configure_onboard_control()
+
+        # the SparkMax absolute encoder isn't simulated, physics.py sets the angle here
+        self.sim_turn_angle: Optional[float] = None
+
         self.reset_encoders()
 
+        # number of sensor reads that went out to the hardware
+        self.hardware_reads = 0
+        self.snapshot = self.read(0.0)
+        self.turn_pid.reset(self.snapshot.turn_angle)
+
         # def __init__(self, chassis_angular_offset=0) -> None:
         #     # set angle offset
         #     self.chassis_angular_offset = chassis_angular_offset
@@ -112,6 +211,59 @@ class SwerveModule:
         #     self.driver_pid.setReference(optimized_state.speed, rev.CANSparkMax.ControlType.kVelocity)
         #     self.turner_pid.setReference(optimized_state.angle.getRadians(), rev.CANSparkMax.ControlType.kPosition)
 
+    def configure_onboard_control(self) -> None:
+        """close the steering and drive loops on the motor controllers"""
+        # the SparkMax loop runs every 1 ms, its I and D gains are per ms
+        self.turn_controller = self.turn_motor.getPIDController()
+        self.turn_controller.setFeedbackDevice(self.turn_encoder)
+        self.turn_controller.setP(SwerveConstants.kPTurning)
+        self.turn_controller.setI(SwerveConstants.kITurning * 0.001)
+        self.turn_controller.setD(SwerveConstants.kDTurning / 0.001)
+        self.turn_controller.setOutputRange(-1, 1)
+        # the shortest way around, like the continuous input of the Python PID
+        self.turn_controller.setPositionPIDWrappingEnabled(True)
+        self.turn_controller.setPositionPIDWrappingMinInput(0)
+        self.turn_controller.setPositionPIDWrappingMaxInput(
+            SwerveConstants.kTurnEncoderRotToRad
+        )
+
+        # kF is the feedforward's kV in 1023 output units per tick per 100 ms,
+        # kS is added as an arbitrary feedforward with every setpoint
+        kV = self.drive_feedforward_gains[1]
+        self.drive_motor.config_kF(
+            0,
+            kV
+            / SwerveConstants.kNominalVoltage
+            * 1023
+            * SwerveConstants.kDriveTicksToMeters
+            * 10,
+        )
+        self.drive_motor.config_kP(0, SwerveConstants.kPDriveVelocity)
+        self.drive_motor.config_kI(0, SwerveConstants.kIDriveVelocity)
+        self.drive_motor.config_kD(0, SwerveConstants.kDDriveVelocity)
+
+        # setpoints instead of duty cycles, still only sent when they change
+        self.drive_output = MotorOutput(self.set_drive_velocity)
+        self.turn_output = MotorOutput(self.set_turn_setpoint)
+
+    def set_drive_velocity(self, ticks_per_100ms: float) -> None:
+        self.drive_velocity_setpoint = (
+            ticks_per_100ms * 10 * SwerveConstants.kDriveTicksToMeters
+        )
+        kS = self.drive_feedforward_gains[0]
+        # no static friction to overcome when asked to stop
+        feedforward = math.copysign(kS, ticks_per_100ms) if ticks_per_100ms else 0.0
+        self.drive_motor.set(
+            ctre.ControlMode.Velocity,
+            ticks_per_100ms,
+            ctre.DemandType.ArbitraryFeedForward,
+            feedforward / SwerveConstants.kNominalVoltage,
+        )
+
+    def set_turn_setpoint(self, angle: float) -> None:
+        self.turn_setpoint = angle
+        self.turn_controller.setReference(angle, rev.CANSparkMax.ControlType.kPosition)
+
     def get_absolute_encoder_rad(self) -> float:
         # # voltage to angle
         # # Divide voltage reading by the voltage supplied to it
@@ -119,7 +271,10 @@ class SwerveModule:
         # # to rad
         # angle *= 2 * math.pi
         # angle -= self.abs_encoder_offset_rad
-        angle = self.turn_encoder.getPosition()
+        if self.sim_turn_angle is None:
+            angle = self.turn_encoder.getPosition()
+        else:
+            angle = self.sim_turn_angle
         if self.abs_encoder_reversed:
             angle *= -1
         return angle
@@ -131,36 +286,150 @@ class SwerveModule:
         # self.drive_encoder.setZeroOffset(self.drive_encoder.getPosition())
         # self.turn_encoder.setZeroOffset(self.get_absolute_encoder_rad())
 
-    def get_state(self) -> SwerveModuleState:
-        return SwerveModuleState(
-            # speed=self.drive_encoder.getVelocity(),
-            speed=self.drive_motor.getSelectedSensorVelocity(),
-            angle=Rotation2d(self.get_absolute_encoder_rad()),
+    def read(self, timestamp: float) -> SwerveModuleSnapshot:
+        """read every sensor of the module from the hardware"""
+        return SwerveModuleSnapshot(
+            timestamp,
+            # self.drive_encoder.getPosition(),
+            self.drive_motor.getSelectedSensorPosition()
+            * SwerveConstants.kDriveTicksToMeters,
+            # self.drive_encoder.getVelocity(), the TalonFX reports ticks per 100 ms
+            self.drive_motor.getSelectedSensorVelocity()
+            * 10
+            * SwerveConstants.kDriveTicksToMeters,
+            self.get_absolute_encoder_rad(),
         )
 
+    def sample(self, timestamp: float) -> SwerveModuleSnapshot:
+        """read the sensors once, the getters use this until the next sample"""
+        self.hardware_reads += self.reads_per_sample
+        self.snapshot = self.read(timestamp)
+        return self.snapshot
+
+    def latch(self, snapshot: SwerveModuleSnapshot) -> None:
+        """use a snapshot that was read somewhere else, e.g. by the odometry thread"""
+        self.snapshot = snapshot
+
+    def get_state(self) -> SwerveModuleState:
+        return self.snapshot.to_state()
+
     def get_position(self) -> SwerveModulePosition:
-        return SwerveModulePosition(
-            # distance=self.drive_encoder.getPosition(),
-            distance=self.drive_motor.getSelectedSensorPosition(),
-            angle=Rotation2d(self.get_absolute_encoder_rad()),
-        )
+        return self.snapshot.to_position()
 
-    def set_desired_state(self, state: SwerveModuleState) -> None:
+    def set_desired_state(
+        self, state: SwerveModuleState, input_time: float = -1.0
+    ) -> None:
         if abs(state.speed) < 0.001:
             self.stop()
+            input_latency.record("actuation", input_time)
             return
 
-        state = SwerveModuleState.optimize(state, self.get_state().angle)
+        state = SwerveModuleState.optimize(state, Rotation2d(self.snapshot.turn_angle))
+        self.set_optimized_state(state.speed, state.angle.radians(), input_time)
 
-        drive_speed = state.speed / SwerveConstants.kDriveMaxMetersPerSecond
-        drive_speed = max(drive_speed, 0.05)
-        self.drive_motor.set(drive_speed)
-        turn_speed = self.turn_pid.calculate(
-            self.turn_encoder.getPosition(), state.angle.radians()
+    def set_optimized_state(
+        self, speed: float, angle: float, input_time: float = -1.0
+    ) -> None:
+        """
+        Drive towards a state that is already optimized against the current angle.
+        `input_time` is when the driver inputs this state came from were read.
+        """
+        self.desired_speed = speed
+        self.desired_angle = angle
+        if abs(speed) < 0.001:
+            self.stop()
+            input_latency.record("actuation", input_time)
+            return
+
+        if self.onboard_control:
+            # the motor controllers close the loops, only send the setpoints
+            self.drive_output.set(speed / SwerveConstants.kDriveTicksToMeters / 10)
+            self.turn_output.set(angle)
+            input_latency.record("actuation", input_time)
+            return
+
+        drive_volts = self.drive_feedforward.calculate(
+            speed, (speed - self.drive_setpoint) / self.period
+        )
+        self.drive_setpoint = speed
+        self.drive_output.set(clamp_duty(drive_volts))
+
+        turn_speed = self.turn_pid.calculate(self.snapshot.turn_angle, angle)
+        turn_velocity = self.turn_pid.getSetpoint().velocity
+        turn_volts = self.turn_feedforward.calculate(
+            turn_velocity, (turn_velocity - self.turn_velocity_setpoint) / self.period
+        )
+        self.turn_velocity_setpoint = turn_velocity
+        self.turn_output.set(
+            clamp_duty(turn_volts + turn_speed * SwerveConstants.kNominalVoltage)
         )
-        turn_speed = max(turn_speed, 0.05)
-        self.turn_motor.set(turn_speed)
+        input_latency.record("actuation", input_time)
 
     def stop(self) -> None:
-        self.drive_motor.set(0)
-        self.turn_motor.set(0)
+        self.desired_speed = 0.0
+        self.drive_output.set(0)
+        self.drive_setpoint = 0.0
+        if not self.onboard_control:
+            # onboard, the steering holds its last angle instead
+            self.turn_output.set(0)
+            # start the next steering profile from where the module is
+            self.turn_pid.reset(self.snapshot.turn_angle)
+            self.turn_velocity_setpoint = 0.0
+
+    def set_characterization_voltage(
+        self, drive_volts: float, turn_volts: Optional[float] = None
+    ) -> None:
+        """
+        Raw voltages past every control loop, for characterization. Without
+        `turn_volts` the steering holds the module straight ahead.
+        """
+        if turn_volts is None:
+            turn_volts = SwerveConstants.kNominalVoltage * (
+                SwerveConstants.kPTurning
+                * math.remainder(-self.snapshot.turn_angle, 2 * math.pi)
+            )
+        self.drive_motor.set(clamp_duty(drive_volts))
+        self.turn_motor.set(clamp_duty(turn_volts))
+        self.characterization_written_at = wp.Timer.getFPGATimestamp()
+        # the next normal command has to be written even if it's the same
+        self.drive_output.reset()
+        self.turn_output.reset()
+        # the motor controllers' loops aren't running anymore
+        self.turn_setpoint = None
+        self.drive_velocity_setpoint = None
+
+    def get_applied_outputs(self) -> Tuple[float, float]:
+        """the duty cycles the drive and turn motors are driven with"""
+        if self.onboard_control:
+            # the outputs hold the closed loop setpoints, the motor controllers
+            # report what their loops apply as of their last status frame
+            return (
+                self.drive_motor.getMotorOutputPercent(),
+                self.turn_motor.getAppliedOutput(),
+            )
+        return self.drive_output.get(), self.turn_output.get()
+
+    def get_setpoints(self) -> Tuple[float, float]:
+        """the onboard drive velocity in m/s and steering angle, nan without"""
+        return (
+            (
+                math.nan
+                if self.drive_velocity_setpoint is None
+                else self.drive_velocity_setpoint
+            ),
+            math.nan if self.turn_setpoint is None else self.turn_setpoint,
+        )
+
+    def get_output_timestamp(self) -> float:
+        """FPGA timestamp of the last command that actually went out to a motor"""
+        return max(
+            self.drive_output.written_at,
+            self.turn_output.written_at,
+            self.characterization_written_at,
+        )
+
+    def get_suppressed_writes(self) -> int:
+        return self.drive_output.suppressed_writes + self.turn_output.suppressed_writes
+
+    def get_writes(self) -> int:
+        return self.drive_output.writes + self.turn_output.writes
@@ -1,62 +1,94 @@
+import logging
 from threading import Thread
 from time import sleep
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from wpimath.kinematics import (
     SwerveModuleState,
     SwerveDrive4Odometry,
     SwerveModulePosition,
 )
 from wpimath.geometry import Rotation2d, Pose2d
-from wpimath.kinematics import SwerveDrive4Kinematics
-from wpilib import SPI
-from navx import AHRS
+from wpimath.kinematics import SwerveDrive4Kinematics, ChassisSpeeds
+from wpilib import SPI, Timer
 from commands2 import SubsystemBase
 from .SwerveModule import SwerveModule
+from .Gyro import Gyro
+from .OdometryThread import OdometryThread, OdometrySample
+from .StatusFrames import SWERVE_PROFILES, estimate_bus_load
 from constants import SwerveConstants, Constants
+from util.LoopTimer import loop_timer
+from util.SwerveKinematics import SwerveKinematics
+from util.PoseHistory import PoseHistory
+
+import numpy as np
+
+logger = logging.getLogger("startup")
 
 
 class SwerveSubsystem(SubsystemBase):
-    front_left = SwerveModule(
-        SwerveConstants.fl_drive_id,
-        SwerveConstants.fl_turn_id,
-        SwerveConstants.fl_abs_encoder_id,
-        period=Constants.period,
-    )
-    front_right = SwerveModule(
-        SwerveConstants.fr_drive_id,
-        SwerveConstants.fr_turn_id,
-        SwerveConstants.fr_abs_encoder_id,
-        period=Constants.period,
-    )
-    back_right = SwerveModule(
-        SwerveConstants.br_drive_id,
-        SwerveConstants.br_turn_id,
-        SwerveConstants.br_abs_encoder_id,
-        period=Constants.period,
-    )
-    back_left = SwerveModule(
-        SwerveConstants.bl_drive_id,
-        SwerveConstants.bl_turn_id,
-        SwerveConstants.bl_abs_encoder_id,
-        period=Constants.period,
-    )
-
-    gyro = AHRS(SPI.Port.kMXP, int(1000 / (Constants.period * 1000)))
-
-    odometer = SwerveDrive4Odometry(
-        SwerveConstants.kDriveKinematics,
-        Rotation2d(0),
-        (
-            front_left.get_position(),
-            front_right.get_position(),
-            back_right.get_position(),
-            back_left.get_position(),
-        ),
-    )
+    kinematics = SwerveKinematics(SwerveConstants.kModuleTranslations)
 
     def __init__(self) -> None:
         super().__init__()
 
+        # the hardware is created here and not as class attributes,
+        # so importing this module doesn't touch it
+        self.front_left = SwerveModule(
+            SwerveConstants.fl_drive_id,
+            SwerveConstants.fl_turn_id,
+            SwerveConstants.fl_abs_encoder_id,
+            period=Constants.period,
+            drive_feedforward=SwerveConstants.kDriveFeedforward[0],
+            turn_feedforward=SwerveConstants.kTurnFeedforward[0],
+        )
+        self.front_right = SwerveModule(
+            SwerveConstants.fr_drive_id,
+            SwerveConstants.fr_turn_id,
+            SwerveConstants.fr_abs_encoder_id,
+            period=Constants.period,
+            drive_feedforward=SwerveConstants.kDriveFeedforward[1],
+            turn_feedforward=SwerveConstants.kTurnFeedforward[1],
+        )
+        self.back_right = SwerveModule(
+            SwerveConstants.br_drive_id,
+            SwerveConstants.br_turn_id,
+            SwerveConstants.br_abs_encoder_id,
+            period=Constants.period,
+            drive_feedforward=SwerveConstants.kDriveFeedforward[2],
+            turn_feedforward=SwerveConstants.kTurnFeedforward[2],
+        )
+        self.back_left = SwerveModule(
+            SwerveConstants.bl_drive_id,
+            SwerveConstants.bl_turn_id,
+            SwerveConstants.bl_abs_encoder_id,
+            period=Constants.period,
+            drive_feedforward=SwerveConstants.kDriveFeedforward[3],
+            turn_feedforward=SwerveConstants.kTurnFeedforward[3],
+        )
+
+        # in the same order as the odometer expects the module positions
+        self.modules = (
+            self.front_left,
+            self.front_right,
+            self.back_right,
+            self.back_left,
+        )
+
+        logger.info(
+            "expected swerve CAN bus load %.1f%%",
+            estimate_bus_load(SWERVE_PROFILES) * 100,
+        )
+
+        # as fast as the odometry reads it, or the main loop without the thread
+        gyro_rate = SwerveConstants.kOdometryFrequencyHz or 1 / Constants.period
+        self.gyro = Gyro(SPI.Port.kMXP, round(gyro_rate))
+
+        self.odometer = SwerveDrive4Odometry(
+            SwerveConstants.kDriveKinematics,
+            Rotation2d(0),
+            tuple(module.get_position() for module in self.modules),
+        )
+
         def reset_gyro():
             """reset gyro after it's calibration of 1s"""
             sleep(1)
@@ -64,12 +96,80 @@ class SwerveSubsystem(SubsystemBase):
 
         Thread(target=reset_gyro).start()
 
+        self.hardware_reads_at_last_sample = 0
+        # hardware reads between the previous sample and the end of this one
+        self.hardware_reads_per_tick = 0
+
+        self.pose_history = PoseHistory(SwerveConstants.kPoseHistoryCapacity)
+
+        # reused by drive_array every loop so driving doesn't allocate
+        self.chassis_speeds = np.zeros(3)
+        self.current_angles = np.zeros(len(self.modules))
+        self.module_speeds = np.zeros(len(self.modules))
+        self.module_angles = np.zeros(len(self.modules))
+
+        # samples the odometer is updated with in this loop, oldest first
+        self.odometry_samples: List[OdometrySample] = []
+
+        self.odometry_thread = None
+        if SwerveConstants.kOdometryFrequencyHz > 0:
+            self.odometry_thread = OdometryThread(
+                self.gyro, self.modules, SwerveConstants.kOdometryFrequencyHz
+            )
+            self.odometry_thread.start()
+
+    def sample_sensors(self) -> None:
+        """read the gyro and module sensors once per loop, before anything uses them"""
+        if self.odometry_thread is None:
+            timestamp = Timer.getFPGATimestamp()
+            self.odometry_samples = [
+                OdometrySample(
+                    self.gyro.sample(timestamp),
+                    tuple(module.sample(timestamp) for module in self.modules),
+                )
+            ]
+        else:
+            # the thread already read everything, use its latest sample for this loop
+            self.odometry_samples = self.odometry_thread.drain()
+            if self.odometry_samples:
+                latest = self.odometry_samples[-1]
+                self.gyro.latch(latest.gyro)
+                for module, snapshot in zip(self.modules, latest.modules):
+                    module.latch(snapshot)
+
+        hardware_reads = self.get_hardware_reads()
+        self.hardware_reads_per_tick = (
+            hardware_reads - self.hardware_reads_at_last_sample
+        )
+        self.hardware_reads_at_last_sample = hardware_reads
+
+    def get_hardware_reads(self) -> int:
+        """reads up to this loop's sample, the odometry thread's as of its drain"""
+        hardware_reads = self.gyro.hardware_reads + sum(
+            module.hardware_reads for module in self.modules
+        )
+        if self.odometry_thread is not None:
+            hardware_reads += self.odometry_thread.drained_hardware_reads
+        return hardware_reads
+
+    def get_output_timestamp(self) -> float:
+        """FPGA timestamp of the last command any module sent to its motors"""
+        return max(module.get_output_timestamp() for module in self.modules)
+
+    def get_suppressed_writes(self) -> int:
+        """motor commands that weren't sent because they hadn't changed"""
+        return sum(module.get_suppressed_writes() for module in self.modules)
+
+    def get_motor_writes(self) -> int:
+        """motor commands sent over CAN"""
+        return sum(module.get_writes() for module in self.modules)
+
     def get_angle(self):
         # return self.gyro.getAngle() % 360
-        return self.gyro.getYaw()
+        return self.gyro.get_yaw()
 
     def get_rotation2d(self):
-        return Rotation2d.fromDegrees(self.get_angle())
+        return self.gyro.get_rotation2d()
 
     def get_pose(self) -> Pose2d:
         return self.odometer.getPose()
@@ -83,18 +183,24 @@ class SwerveSubsystem(SubsystemBase):
             self.back_right.get_position(),
             self.back_left.get_position(),
         )
+        # the old poses are in a different frame now
+        self.pose_history.clear()
 
     # override
+    @loop_timer.timed("SwerveSubsystem.periodic")
     def periodic(self) -> None:
         # TODO print gyro angle, robot pose on dashboard
 
-        self.odometer.update(
-            self.get_rotation2d(),
-            self.front_left.get_position(),
-            self.front_right.get_position(),
-            self.back_right.get_position(),
-            self.back_left.get_position(),
-        )
+        for sample in self.odometry_samples:
+            pose = self.odometer.update(
+                Rotation2d.fromDegrees(sample.gyro.yaw),
+                *(snapshot.to_position() for snapshot in sample.modules),
+            )
+            self.pose_history.add_pose(sample.gyro.timestamp, pose)
+
+    def get_pose_at(self, timestamp: float) -> Optional[Pose2d]:
+        """where the robot was at an FPGA timestamp, e.g. when a camera saw a target"""
+        return self.pose_history.sample(timestamp)
 
     def stop(self) -> None:
         self.front_left.stop()
@@ -105,6 +211,7 @@ class SwerveSubsystem(SubsystemBase):
     def set_module_states_list(self, states: List[SwerveModuleState]) -> None:
         self.set_module_states(tuple(states))  # type: ignore
 
+    @loop_timer.timed("SwerveSubsystem.set_module_states")
     def set_module_states(
         self,
         states: Tuple[
@@ -114,7 +221,33 @@ class SwerveSubsystem(SubsystemBase):
         SwerveDrive4Kinematics.desaturateWheelSpeeds(
             states, SwerveConstants.kWheelMaxSpeedMetersPerSecond
         )
-        self.front_left.set_desired_state(states[0])
-        self.front_right.set_desired_state(states[1])
-        self.back_left.set_desired_state(states[2])
-        self.back_right.set_desired_state(states[3])
+        # the states are in the same order as the module translations
+        for module, state in zip(self.modules, states):
+            module.set_desired_state(state)
+
+    def drive(self, chassis_speeds: ChassisSpeeds) -> None:
+        self.chassis_speeds[0] = chassis_speeds.vx
+        self.chassis_speeds[1] = chassis_speeds.vy
+        self.chassis_speeds[2] = chassis_speeds.omega
+        self.drive_array(self.chassis_speeds)
+
+    @loop_timer.timed("SwerveSubsystem.drive")
+    def drive_array(self, chassis_speeds: np.ndarray, input_time: float = -1.0) -> None:
+        """
+        Drive robot relative (vx, vy, omega), desaturating and optimizing all
+        module states in one batched kinematics pass over preallocated buffers.
+        `input_time` tags the outputs with when their driver inputs were read.
+        """
+        for i, module in enumerate(self.modules):
+            self.current_angles[i] = module.snapshot.turn_angle
+        self.kinematics.to_module_states_into(
+            chassis_speeds,
+            self.current_angles,
+            SwerveConstants.kWheelMaxSpeedMetersPerSecond,
+            self.module_speeds,
+            self.module_angles,
+        )
+        for i, module in enumerate(self.modules):
+            module.set_optimized_state(
+                self.module_speeds.item(i), self.module_angles.item(i), input_time
+            )
@@ -0,0 +1,23 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def isolated():
+    """
+    Runs a function in a fresh process and returns its result. The CAN devices,
+    HAL handles and module level constants a test touches don't leak into the
+    next test, the same way sim.GainTuner runs its scenarios.
+    """
+
+    def run(function, *args):
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=1,
+        ) as executor:
+            return executor.submit(function, *args).result()
+
+    return run
@@ -0,0 +1,6 @@
+"""
+The standard pyfrc tests: the robot boots and runs through every mode
+without exceptions. Run everything in this folder with `python robot.py test`.
+"""
+
+from pyfrc.tests import *
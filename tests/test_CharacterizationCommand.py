@@ -0,0 +1,22 @@
+import os
+
+import numpy as np
+
+from commands.CharacterizationCommand import DRIVE, STEER, save_feedforward
+from constants import SwerveConstants, load_gains
+
+
+def test_fitted_gains_are_loaded(tmp_path, monkeypatch):
+    for name in ("kDriveFeedforward", "kTurnFeedforward"):
+        monkeypatch.setattr(SwerveConstants, name, getattr(SwerveConstants, name))
+    # like a fresh checkout, without the deploy directory
+    path = os.path.join(tmp_path, "deploy", "gains.json")
+    drive = np.array([(0.1 * i, 2.4, 0.3) for i in range(4)])
+    steer = np.array([(0.05, 0.4 + 0.01 * i, 0.01) for i in range(4)])
+
+    save_feedforward(DRIVE, drive, path)
+    save_feedforward(STEER, steer, path)
+    load_gains(path)
+
+    np.testing.assert_array_equal(SwerveConstants.kDriveFeedforward, drive)
+    np.testing.assert_array_equal(SwerveConstants.kTurnFeedforward, steer)
@@ -0,0 +1,118 @@
+import math
+
+MODES = ((False, False), (True, False), (False, True))
+
+
+def pipeline_and_wpimath(field_oriented: bool, right_stick_sets_angle: bool):
+    """
+    The module states the pipeline commands and the ones the old chain of
+    wpimath objects computes from the same sticks, as (x, y) wheel velocities
+    so a flipped module compares equal.
+    """
+    import hal
+    import numpy as np
+    import wpilib.simulation
+    from wpimath.controller import PIDController
+    from wpimath.filter import SlewRateLimiter
+    from wpimath.geometry import Rotation2d
+    from wpimath.kinematics import (
+        ChassisSpeeds,
+        SwerveDrive4Kinematics,
+        SwerveModuleState,
+    )
+
+    from constants import Constants, SwerveConstants
+    from subsystems.SwerveSubsystem import SwerveSubsystem
+    from util.DrivePipeline import DrivePipeline, dz
+
+    hal.initialize(500, 0)
+    # the slew rate limiters of both paths see the same clock
+    wpilib.simulation.pauseTiming()
+    SwerveConstants.kOdometryFrequencyHz = 0
+    swerve_subsystem = SwerveSubsystem()
+    swerve_subsystem.sample_sensors()
+    pipeline = DrivePipeline(swerve_subsystem)
+
+    x_limiter = SlewRateLimiter(SwerveConstants.kDriveMaxAccelerationMetersPerSecond)
+    y_limiter = SlewRateLimiter(SwerveConstants.kDriveMaxAccelerationMetersPerSecond)
+    z_limiter = SlewRateLimiter(
+        SwerveConstants.kDriveMaxTurnAccelerationMetersPerSecond
+    )
+    rotate_to_angle_pid = PIDController(
+        SwerveConstants.kPRobotTurn,
+        SwerveConstants.kIRobotTurn,
+        SwerveConstants.kDRobotTurn,
+        period=Constants.period,
+    )
+    rotate_to_angle_pid.enableContinuousInput(-180, 180)
+
+    def wpimath_states(left_x, left_y, right_x, right_y):
+        x = x_limiter.calculate(dz(left_x))
+        y = y_limiter.calculate(dz(left_y))
+        z = dz(right_x)
+        robot_oriented = not field_oriented
+        if right_stick_sets_angle:
+            ry = dz(right_y)
+            if math.hypot(z, ry) > DrivePipeline.right_stick_threshold:
+                z = rotate_to_angle_pid.calculate(
+                    swerve_subsystem.get_angle(), math.degrees(math.atan2(ry, z))
+                )
+            else:
+                z = 0.0
+            robot_oriented = False
+        elif field_oriented:
+            z = z_limiter.calculate(z)
+
+        chassis_speeds = ChassisSpeeds(x, y, z)
+        if not robot_oriented:
+            chassis_speeds = ChassisSpeeds.fromFieldRelativeSpeeds(
+                chassis_speeds, swerve_subsystem.get_rotation2d()
+            )
+        states = SwerveConstants.kDriveKinematics.toSwerveModuleStates(chassis_speeds)
+        SwerveDrive4Kinematics.desaturateWheelSpeeds(
+            states, SwerveConstants.kWheelMaxSpeedMetersPerSecond
+        )
+        return [
+            SwerveModuleState.optimize(state, Rotation2d(module.snapshot.turn_angle))
+            for module, state in zip(swerve_subsystem.modules, states)
+        ]
+
+    rng = np.random.default_rng(0)
+    # far enough from the deadband that both paths always drive
+    axes = rng.uniform(0.2, 1, (200, 4)) * rng.choice((-1, 1), (200, 4))
+
+    pipeline_velocities = []
+    wpimath_velocities = []
+    for left_x, left_y, right_x, right_y in axes.tolist():
+        wpilib.simulation.stepTiming(Constants.period)
+        pipeline.execute(
+            left_x, left_y, right_x, right_y, field_oriented, right_stick_sets_angle
+        )
+        pipeline_velocities.append(
+            [
+                (
+                    module.desired_speed * math.cos(module.desired_angle),
+                    module.desired_speed * math.sin(module.desired_angle),
+                )
+                for module in swerve_subsystem.modules
+            ]
+        )
+        wpimath_velocities.append(
+            [
+                (state.speed * state.angle.cos(), state.speed * state.angle.sin())
+                for state in wpimath_states(left_x, left_y, right_x, right_y)
+            ]
+        )
+    return pipeline_velocities, wpimath_velocities
+
+
+def test_pipeline_matches_wpimath(isolated):
+    import numpy as np
+
+    for field_oriented, right_stick_sets_angle in MODES:
+        pipeline_velocities, wpimath_velocities = isolated(
+            pipeline_and_wpimath, field_oriented, right_stick_sets_angle
+        )
+        np.testing.assert_allclose(
+            pipeline_velocities, wpimath_velocities, rtol=0, atol=1e-9
+        )
@@ -0,0 +1,6 @@
+from sim.InputLatency import measure
+
+
+def test_stick_moves_act_in_the_same_loop(isolated):
+    loops = isolated(measure, 5)
+    assert max(loops) <= 1
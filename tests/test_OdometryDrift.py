@@ -0,0 +1,7 @@
+from sim.OdometryDrift import measure_drift
+
+
+def test_odometry_thread_drifts_less(isolated):
+    once_per_loop = isolated(measure_drift, 0)
+    odometry_thread = isolated(measure_drift, 200)
+    assert odometry_thread < once_per_loop
@@ -0,0 +1,15 @@
+from util.PoseHistory import PoseHistory
+
+
+def test_out_of_order_samples_keep_the_history():
+    history = PoseHistory(3)
+    for timestamp, x in ((1.0, 1.0), (2.0, 2.0), (3.0, 3.0), (4.0, 4.0)):
+        history.add(timestamp, x, 0.0, 0.0)
+
+    # an older sample is dropped, one at the same time replaces the newest
+    history.add(2.5, 9.0, 0.0, 0.0)
+    history.add(4.0, 5.0, 0.0, 0.0)
+
+    assert len(history) == 3
+    assert [history.get_pose(i).X() for i in range(3)] == [2.0, 3.0, 5.0]
+    assert history.sample(3.5).X() == 4.0
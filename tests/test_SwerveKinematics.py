@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+from wpimath.geometry import Rotation2d
+from wpimath.kinematics import ChassisSpeeds, SwerveDrive4Kinematics, SwerveModuleState
+
+from constants import SwerveConstants
+from util.SwerveKinematics import SwerveKinematics, wrap_angle
+
+MAX_SPEED = SwerveConstants.kWheelMaxSpeedMetersPerSecond
+
+
+def wpimath_states(kinematics, chassis_speeds, current_angles):
+    states = kinematics.toSwerveModuleStates(ChassisSpeeds(*chassis_speeds))
+    SwerveDrive4Kinematics.desaturateWheelSpeeds(states, MAX_SPEED)
+    return [
+        SwerveModuleState.optimize(state, Rotation2d(angle))
+        for state, angle in zip(states, current_angles)
+    ]
+
+
+def assert_equivalent(states, speeds, angles):
+    # a flipped module is the same state as long as speed and angle flip together
+    np.testing.assert_allclose(
+        [state.speed for state in states], speeds, rtol=0, atol=1e-9
+    )
+    angle_errors = wrap_angle(
+        np.array([state.angle.radians() for state in states]) - angles
+    )
+    np.testing.assert_allclose(angle_errors, 0, rtol=0, atol=1e-9)
+
+
+def random_speeds(rows: int):
+    rng = np.random.default_rng(0)
+    chassis_speeds = rng.uniform(-3, 3, (rows, 3))
+    current_angles = rng.uniform(-math.pi, math.pi, (rows, 4))
+    return chassis_speeds, current_angles
+
+
+def test_single_matches_wpimath():
+    kinematics = SwerveKinematics(SwerveConstants.kModuleTranslations)
+    wpimath_kinematics = SwerveDrive4Kinematics(*SwerveConstants.kModuleTranslations)
+    for chassis_speeds, current_angles in zip(*random_speeds(100)):
+        speeds, angles, _ = kinematics.to_module_states(
+            chassis_speeds, current_angles, MAX_SPEED
+        )
+        states = wpimath_states(
+            wpimath_kinematics, chassis_speeds.tolist(), current_angles.tolist()
+        )
+        assert_equivalent(states, speeds, angles)
+
+
+def test_batch_matches_wpimath():
+    kinematics = SwerveKinematics(SwerveConstants.kModuleTranslations)
+    wpimath_kinematics = SwerveDrive4Kinematics(*SwerveConstants.kModuleTranslations)
+    chassis_speeds, current_angles = random_speeds(1000)
+    speeds, angles, _ = kinematics.to_module_states(
+        chassis_speeds, current_angles, MAX_SPEED
+    )
+    for row in range(len(chassis_speeds)):
+        states = wpimath_states(
+            wpimath_kinematics,
+            chassis_speeds[row].tolist(),
+            current_angles[row].tolist(),
+        )
+        assert_equivalent(states, speeds[row], angles[row])
+
+
+def test_stopped_chassis_keeps_headings():
+    """like wpimath, the modules keep pointing where they last drove"""
+    kinematics = SwerveKinematics(SwerveConstants.kModuleTranslations)
+    wpimath_kinematics = SwerveDrive4Kinematics(*SwerveConstants.kModuleTranslations)
+    chassis_speeds = np.array(
+        [(0, 0, 0), (1, 2, 0.5), (0, 0, 0), (0, 0, 0), (-2, 0, 0), (0, 0, 0)],
+        dtype=float,
+    )
+    current_angles = np.zeros((len(chassis_speeds), 4))
+
+    speeds, angles, headings = kinematics.to_module_states(
+        chassis_speeds, current_angles
+    )
+    for row in range(len(chassis_speeds)):
+        states = wpimath_states(
+            wpimath_kinematics,
+            chassis_speeds[row].tolist(),
+            current_angles[row].tolist(),
+        )
+        assert_equivalent(states, speeds[row], angles[row])
+    np.testing.assert_array_equal(angles[2], angles[1])
+    np.testing.assert_array_equal(angles[5], angles[4])
+
+    # the headings of the last moving row carry over into the next call
+    np.testing.assert_allclose(wrap_angle(headings - math.pi), 0, atol=1e-12)
+    single_speeds, single_angles, _ = kinematics.to_module_states(
+        np.zeros(3), headings=headings
+    )
+    np.testing.assert_array_equal(single_speeds, 0)
+    np.testing.assert_array_equal(single_angles, headings)
+
+
+def test_batches_leave_the_live_headings_alone():
+    kinematics = SwerveKinematics(SwerveConstants.kModuleTranslations)
+    speeds = np.zeros(4)
+    angles = np.zeros(4)
+    kinematics.to_module_states_into(
+        np.array((0.0, 1.0, 0.0)), np.zeros(4), MAX_SPEED, speeds, angles
+    )
+
+    kinematics.to_module_states(random_speeds(100)[0])
+    kinematics.to_module_states(np.array((1.0, 0.0, 0.0)))
+
+    # stopped, the live drive still points where it last drove
+    kinematics.to_module_states_into(
+        np.zeros(3), np.zeros(4), MAX_SPEED, speeds, angles
+    )
+    np.testing.assert_allclose(angles, math.pi / 2)
+
+
+def test_forward_kinematics_round_trip():
+    kinematics = SwerveKinematics(SwerveConstants.kModuleTranslations)
+    chassis_speeds, _ = random_speeds(1000)
+    speeds, angles, _ = kinematics.to_module_states(chassis_speeds)
+    forward = kinematics.to_chassis_speeds(speeds, angles)
+    np.testing.assert_allclose(forward, chassis_speeds, atol=1e-9)
@@ -0,0 +1,43 @@
+def sample_twice() -> int:
+    import hal
+
+    from constants import SwerveConstants
+    from subsystems.SwerveSubsystem import SwerveSubsystem
+
+    hal.initialize(500, 0)
+    # sample on the main loop, without the odometry thread
+    SwerveConstants.kOdometryFrequencyHz = 0
+    swerve_subsystem = SwerveSubsystem()
+    swerve_subsystem.sample_sensors()
+    swerve_subsystem.sample_sensors()
+    return swerve_subsystem.hardware_reads_per_tick
+
+
+def test_hardware_reads_per_tick(isolated):
+    # the gyro's yaw, pitch, roll and rate, and each module's drive position,
+    # drive velocity and absolute angle, read once per loop
+    assert isolated(sample_twice) == 4 + 4 * 3
+
+
+def drain_two_samples() -> int:
+    import hal
+
+    from constants import SwerveConstants
+    from subsystems.SwerveSubsystem import SwerveSubsystem
+
+    hal.initialize(500, 0)
+    SwerveConstants.kOdometryFrequencyHz = 250
+    swerve_subsystem = SwerveSubsystem()
+    odometry_thread = swerve_subsystem.odometry_thread
+    # sample by hand so the count doesn't depend on the notifier's timing
+    odometry_thread.stop()
+    swerve_subsystem.sample_sensors()
+    odometry_thread.sample()
+    odometry_thread.sample()
+    swerve_subsystem.sample_sensors()
+    return swerve_subsystem.hardware_reads_per_tick
+
+
+def test_odometry_thread_reads_per_tick(isolated):
+    # counted under the thread's lock, only the reads of the drained samples
+    assert isolated(drain_two_samples) == 2 * (4 + 4 * 3)
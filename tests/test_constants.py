@@ -0,0 +1,19 @@
+import os
+
+from constants import AutoConstants, SwerveConstants, load_gains, save_gains
+
+
+def test_gains_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(SwerveConstants, "kPTurning", SwerveConstants.kPTurning)
+    monkeypatch.setattr(AutoConstants, "kPTheta", AutoConstants.kPTheta)
+    # like a fresh checkout, without the deploy directory
+    path = os.path.join(tmp_path, "deploy", "gains.json")
+
+    save_gains("SwerveConstants", {"kPTurning": 1.25}, path)
+    save_gains("AutoConstants", {"kPTheta": 2.5}, path)
+    SwerveConstants.kPTurning = 0.0
+    AutoConstants.kPTheta = 0.0
+    load_gains(path)
+
+    assert SwerveConstants.kPTurning == 1.25
+    assert AutoConstants.kPTheta == 2.5
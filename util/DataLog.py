@@ -0,0 +1,223 @@
+import errno
+import gzip
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from wpilib import getOperatingDirectory
+
+from constants import Constants
+
+logger = logging.getLogger("loop")
+
+# WPILOG: the magic, version 1.0 and an extra header string
+MAGIC = b"WPILOG"
+VERSION = 0x0100
+EXTRA_HEADER = "frc2023 telemetry"
+
+# record header bytes: entry id length - 1 in bits 0-1, payload size length - 1
+# in bits 2-3 and timestamp length - 1 in bits 4-6. Every record here uses a
+# 2 byte id and an 8 byte timestamp so data records have a fixed width.
+DATA_HEADER = 0x71  # 1 byte payload size
+CONTROL_HEADER = 0x7D  # 4 byte payload size
+CONTROL_ENTRY = 0
+START = 0
+
+# one double of one channel, entry ids are the telemetry channel index + 1
+DATA_RECORD = np.dtype(
+    [
+        ("header", "u1"),
+        ("entry", "<u2"),
+        ("size", "u1"),
+        ("timestamp", "<u8"),
+        ("value", "<f8"),
+    ]
+)
+CONTROL_RECORD = struct.Struct("<BHIQ")
+
+
+def default_directory() -> str:
+    """the USB stick when one is plugged into the roboRIO, like DataLogManager"""
+    if os.path.isdir("/u"):
+        return "/u/logs"
+    return os.path.join(getOperatingDirectory(), "logs")
+
+
+def encode_string(value: str) -> bytes:
+    encoded = value.encode()
+    return struct.pack("<I", len(encoded)) + encoded
+
+
+def encode_start(entry: int, name: str, timestamp_us: int) -> bytes:
+    payload = (
+        struct.pack("<BI", START, entry)
+        + encode_string(name)
+        + encode_string("double")
+        + encode_string("")
+    )
+    return (
+        CONTROL_RECORD.pack(CONTROL_HEADER, CONTROL_ENTRY, len(payload), timestamp_us)
+        + payload
+    )
+
+
+def compress(path: str) -> None:
+    # the fastest level, the roboRIO has two slow cores
+    with open(path, "rb") as source, gzip.open(path + ".gz", "wb", 1) as target:
+        shutil.copyfileobj(source, target)
+    os.remove(path)
+
+
+class DataLogWriter:
+    """
+    Telemetry sink that writes every channel of every frame to WPILOG files,
+    readable by AdvantageScope and the WPILib log tools. It runs on the
+    telemetry thread: a batch of frames becomes one numpy array of fixed width
+    records and one buffered write. Files are rotated after `segment_bytes`
+    and closed files are gzipped on their own thread when `compress` is set,
+    one at a time, on a daemon thread so an unfinished one never holds up the
+    program's exit (its .wpilog stays until the .gz is complete).
+    Before every file the logs of earlier sessions are deleted, oldest first,
+    until it fits with `min_free_bytes` to spare, so the roboRIO's flash never
+    fills up.
+    """
+
+    def __init__(
+        self,
+        directory: str = default_directory(),
+        segment_bytes: int = Constants.datalog_segment_bytes,
+        compress: bool = Constants.datalog_compress,
+        buffer_bytes: int = Constants.datalog_buffer_bytes,
+        flush_period: float = Constants.datalog_flush_period,
+        min_free_bytes: int = Constants.datalog_min_free_bytes,
+        compress_timeout: float = Constants.datalog_compress_timeout,
+    ) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.buffer_bytes = buffer_bytes
+        self.flush_period = flush_period
+        self.min_free_bytes = min_free_bytes
+        self.compress_timeout = compress_timeout
+
+        self.session = time.strftime("%Y%m%d_%H%M%S")
+        self.segment = 0
+        self.path: Optional[str] = None
+        self.file = None
+        self.flushed_at = 0.0
+        # channels whose start record is in the current file
+        self.started = 0
+        self.failed = False
+        self.compress_thread: Optional[threading.Thread] = None
+
+        self.records = np.zeros(0, DATA_RECORD)
+
+    def __call__(
+        self, names: List[str], timestamps: np.ndarray, frames: np.ndarray
+    ) -> None:
+        if self.failed:
+            return
+        try:
+            self.write(names, timestamps, frames)
+        except OSError:
+            # a full or missing disk shouldn't take the robot down with it
+            logger.exception("stopped writing %s", self.path)
+            self.failed = True
+
+    def write(
+        self, names: List[str], timestamps: np.ndarray, frames: np.ndarray
+    ) -> None:
+        timestamps_us = np.rint(timestamps * 1_000_000).astype(np.uint64)
+        if self.file is None or self.file.tell() >= self.segment_bytes:
+            self.open_segment()
+
+        if self.started < len(names):
+            self.file.write(
+                b"".join(
+                    encode_start(entry + 1, names[entry], int(timestamps_us[0]))
+                    for entry in range(self.started, len(names))
+                )
+            )
+            self.started = len(names)
+
+        frame_count, channel_count = frames.shape
+        records = self.get_records(frame_count * channel_count).reshape(
+            frame_count, channel_count
+        )
+        records["entry"] = np.arange(1, channel_count + 1, dtype=np.uint16)
+        records["timestamp"] = timestamps_us[:, np.newaxis]
+        records["value"] = frames
+        self.file.write(records.data)
+
+        now = time.monotonic()
+        if now - self.flushed_at >= self.flush_period:
+            self.file.flush()
+            self.flushed_at = now
+
+    def get_records(self, count: int) -> np.ndarray:
+        """the record buffer, only reallocated when a batch is larger than before"""
+        if len(self.records) < count:
+            self.records = np.zeros(count, DATA_RECORD)
+            self.records["header"] = DATA_HEADER
+            self.records["size"] = DATA_RECORD["value"].itemsize
+        return self.records[:count]
+
+    def open_segment(self) -> None:
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.make_space()
+        self.path = os.path.join(
+            self.directory, f"FRC_{self.session}_{self.segment:03}.wpilog"
+        )
+        self.segment += 1
+        self.file = open(self.path, "wb", buffering=self.buffer_bytes)
+        self.file.write(
+            MAGIC
+            + struct.pack("<HI", VERSION, len(EXTRA_HEADER))
+            + EXTRA_HEADER.encode()
+        )
+        # every file starts its channels again so it can be read on its own
+        self.started = 0
+
+    def make_space(self) -> None:
+        """delete the oldest logs of earlier sessions until a segment fits"""
+        needed = self.segment_bytes + self.min_free_bytes
+        # the session timestamp in the names sorts them oldest first
+        old_logs = sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.startswith("FRC_")
+            and not name.startswith(f"FRC_{self.session}_")
+            and name.endswith((".wpilog", ".wpilog.gz"))
+        )
+        for name in old_logs:
+            if shutil.disk_usage(self.directory).free >= needed:
+                return
+            os.remove(os.path.join(self.directory, name))
+            logger.warning("deleted %s to make space for the log", name)
+
+        if shutil.disk_usage(self.directory).free < needed:
+            raise OSError(errno.ENOSPC, "no space left for the log", self.directory)
+
+    def close(self) -> None:
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if self.compress:
+            if self.compress_thread is not None:
+                self.compress_thread.join(self.compress_timeout)
+                if self.compress_thread.is_alive():
+                    logger.warning("still compressing the log before %s", self.path)
+            self.compress_thread = threading.Thread(
+                target=compress,
+                args=(self.path,),
+                name="datalog compress",
+                daemon=True,
+            )
+            self.compress_thread.start()
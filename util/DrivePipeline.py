@@ -0,0 +1,201 @@
+import math
+
+import numpy as np
+from wpimath.controller import PIDController
+from wpimath.filter import SlewRateLimiter
+
+from constants import Constants, SwerveConstants
+from subsystems.DriverInputs import DriverInputs
+from subsystems.SwerveSubsystem import SwerveSubsystem
+from util.LatencyHistogram import input_latency
+from util.LoopTimer import loop_timer
+from util.Telemetry import telemetry
+
+
+def dz(x: float, dz: float = Constants.controller_deadzone):
+    return x if abs(x) > dz else 0
+
+
+class DrivePipeline:
+    """
+    Teleop driving from controller axes to motor outputs in one pass:
+    deadband -> slew rate limit -> field relative -> kinematics -> modules.
+    The chassis speeds go through the same preallocated buffer every loop and
+    no wpimath objects are created per tick.
+    """
+
+    # the right stick only sets the heading when it's pushed at least this far
+    right_stick_threshold = 0.25
+
+    def __init__(self, swerve_subsystem: SwerveSubsystem) -> None:
+        self.swerve_subsystem = swerve_subsystem
+
+        self.x_limiter = SlewRateLimiter(
+            SwerveConstants.kDriveMaxAccelerationMetersPerSecond
+        )
+        self.y_limiter = SlewRateLimiter(
+            SwerveConstants.kDriveMaxAccelerationMetersPerSecond
+        )
+        self.z_limiter = SlewRateLimiter(
+            SwerveConstants.kDriveMaxTurnAccelerationMetersPerSecond
+        )
+
+        self.rotate_to_angle_pid = PIDController(
+            SwerveConstants.kPRobotTurn,
+            SwerveConstants.kIRobotTurn,
+            SwerveConstants.kDRobotTurn,
+            period=Constants.period,
+        )
+        self.rotate_to_angle_pid.enableContinuousInput(-180, 180)
+        self.rotate_to_angle_pid.setTolerance(5)  # degrees tolerance
+
+        # robot relative (vx, vy, omega) handed to the swerve subsystem
+        self.chassis_speeds = np.zeros(3)
+
+    def execute_inputs(
+        self,
+        driver_inputs: DriverInputs,
+        port: int,
+        field_oriented: bool,
+        right_stick_sets_angle: bool,
+    ) -> None:
+        """drive with the sticks of the controller on `port` sampled this loop"""
+        self.execute(
+            driver_inputs.get_axis(port, 0),
+            driver_inputs.get_axis(port, 1),
+            driver_inputs.get_axis(port, 4),
+            driver_inputs.get_axis(port, 5),
+            field_oriented,
+            right_stick_sets_angle,
+            driver_inputs.read_time,
+        )
+
+    @loop_timer.timed("DrivePipeline.execute")
+    def execute(
+        self,
+        left_x: float,
+        left_y: float,
+        right_x: float,
+        right_y: float,
+        field_oriented: bool,
+        right_stick_sets_angle: bool,
+        input_time: float = -1.0,
+    ) -> None:
+        input_latency.record("pipeline", input_time)
+
+        x = self.x_limiter.calculate(dz(left_x))
+        y = self.y_limiter.calculate(dz(left_y))
+        z = dz(right_x)
+
+        if right_stick_sets_angle:
+            ry = dz(right_y)
+            if math.hypot(z, ry) > self.right_stick_threshold:
+                z = self.rotate_to_angle_pid.calculate(
+                    self.swerve_subsystem.get_angle(), math.degrees(math.atan2(ry, z))
+                )
+            else:
+                # keep the current heading while the stick is released
+                z = 0.0
+            field_oriented = True
+        elif field_oriented:
+            z = self.z_limiter.calculate(z)
+        # TODO slew rate limit z when robot oriented too
+
+        if field_oriented:
+            # rotate the field relative speeds into the robot frame
+            rotation = self.swerve_subsystem.get_rotation2d()
+            cos, sin = rotation.cos(), rotation.sin()
+            x, y = x * cos + y * sin, y * cos - x * sin
+
+        self.chassis_speeds[0] = x
+        self.chassis_speeds[1] = y
+        self.chassis_speeds[2] = z
+        telemetry.record("Drive X", x)
+        telemetry.record("Drive Y", y)
+        telemetry.record("Drive Rotation", z)
+        self.swerve_subsystem.drive_array(self.chassis_speeds, input_time)
+
+
+def benchmark(iterations: int = 5000, budget_us: float = 250.0) -> bool:
+    """
+    Per tick cost of the pipeline against the simulated hardware, compared with
+    the old chain of wpimath objects. Returns whether it stays within budget.
+    """
+    from timeit import timeit
+
+    import hal
+    from wpimath.geometry import Rotation2d
+    from wpimath.kinematics import (
+        ChassisSpeeds,
+        SwerveDrive4Kinematics,
+        SwerveModuleState,
+    )
+
+    hal.initialize(500, 0)
+    # sample on the main loop, the benchmark has no odometry thread to drain
+    SwerveConstants.kOdometryFrequencyHz = 0
+    swerve_subsystem = SwerveSubsystem()
+    swerve_subsystem.sample_sensors()
+    pipeline = DrivePipeline(swerve_subsystem)
+
+    rng = np.random.default_rng(0)
+    axes = rng.uniform(-1, 1, (iterations, 4)).tolist()
+    modes = ((False, False), (True, False), (False, True))
+
+    def run_pipeline(field_oriented: bool, right_stick_sets_angle: bool) -> None:
+        for left_x, left_y, right_x, right_y in axes:
+            pipeline.execute(
+                left_x, left_y, right_x, right_y, field_oriented, right_stick_sets_angle
+            )
+
+    def run_wpimath() -> None:
+        for left_x, left_y, right_x, _ in axes:
+            chassis_speeds = ChassisSpeeds.fromFieldRelativeSpeeds(
+                ChassisSpeeds(left_x, left_y, right_x),
+                swerve_subsystem.get_rotation2d(),
+            )
+            states = SwerveConstants.kDriveKinematics.toSwerveModuleStates(
+                chassis_speeds
+            )
+            SwerveDrive4Kinematics.desaturateWheelSpeeds(
+                states, SwerveConstants.kWheelMaxSpeedMetersPerSecond
+            )
+            for module, state in zip(swerve_subsystem.modules, states):
+                state = SwerveModuleState.optimize(
+                    state, Rotation2d(module.snapshot.turn_angle)
+                )
+                module.set_optimized_state(state.speed, state.angle.radians())
+
+    within_budget = True
+    for field_oriented, right_stick_sets_angle in modes:
+        tick_us = (
+            timeit(
+                lambda: run_pipeline(field_oriented, right_stick_sets_angle), number=1
+            )
+            / iterations
+            * 1e6
+        )
+        within_budget = within_budget and tick_us <= budget_us
+        print(
+            f"field oriented {field_oriented!s:5}  right stick angle "
+            f"{right_stick_sets_angle!s:5}  {tick_us:8.2f} us/tick"
+        )
+
+    wpimath_us = timeit(run_wpimath, number=1) / iterations * 1e6
+    print(f"wpimath objects                            {wpimath_us:8.2f} us/tick")
+    print(f"budget {budget_us:.0f} us/tick: {'ok' if within_budget else 'exceeded'}")
+    return within_budget
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="time the teleop drive pipeline, fails when over budget"
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=5000)
+    parser.add_argument("--budget-us", type=float, default=250.0)
+    args = parser.parse_args()
+
+    sys.exit(0 if benchmark(args.iterations, args.budget_us) else 1)
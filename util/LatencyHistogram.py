@@ -0,0 +1,106 @@
+from array import array
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+from ntcore import NetworkTableInstance
+
+from constants import Constants
+from util.LoopTimer import TimingBuffer
+
+
+class LatencyHistogram:
+    """latencies in seconds counted into fixed width bins, the last bin is overflow"""
+
+    def __init__(
+        self,
+        bin_width: float = Constants.latency_histogram_bin_ms / 1000,
+        bin_count: int = Constants.latency_histogram_bins,
+        buffer_size: int = Constants.loop_timing_buffer_size,
+    ) -> None:
+        self.bin_width = bin_width
+        self.counts = array("q", bytes(8 * (bin_count + 1)))
+        # the most recent latencies for the rolling percentiles
+        self.recent = TimingBuffer(buffer_size)
+        self.total = 0
+
+    def add(self, latency: float) -> None:
+        index = int(latency / self.bin_width)
+        self.counts[min(max(index, 0), len(self.counts) - 1)] += 1
+        self.recent.add(latency)
+        self.total += 1
+
+    def bin_edges_ms(self) -> Tuple[float, ...]:
+        """lower edge of every bin"""
+        return tuple(i * self.bin_width * 1000 for i in range(len(self.counts)))
+
+
+class LatencyMonitor:
+    """
+    Measures how long after the driver inputs were read each stage of the
+    robot acted on them, and publishes a histogram and rolling percentiles
+    (in ms) per stage to the InputLatency table at a low rate.
+    """
+
+    def __init__(
+        self,
+        table_name: str = "InputLatency",
+        publish_period: float = Constants.loop_timing_publish_period,
+        period: float = Constants.period,
+    ) -> None:
+        self.table_name = table_name
+        self.publish_every = max(1, round(publish_period / period))
+        self.loops = 0
+
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.publishers: Dict[str, Tuple] = {}
+
+    def get_histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        return histogram
+
+    def record(
+        self, stage: str, input_time: float, now: Optional[float] = None
+    ) -> None:
+        """`input_time` is the perf_counter time the inputs were read at"""
+        if input_time < 0:
+            return
+        if now is None:
+            now = perf_counter()
+        self.get_histogram(stage).add(now - input_time)
+
+    def end_loop(self) -> None:
+        self.loops += 1
+        if self.loops % self.publish_every == 0:
+            self.publish()
+
+    def publish(self) -> None:
+        for stage, histogram in self.histograms.items():
+            publishers = self.publishers.get(stage)
+            if publishers is None:
+                table = NetworkTableInstance.getDefault().getTable(
+                    self.table_name + "/" + stage
+                )
+                # the bins never change, their edges are only set once
+                edges_publisher = table.getDoubleArrayTopic("bin_edges_ms").publish()
+                edges_publisher.set(list(histogram.bin_edges_ms()))
+                publishers = self.publishers[stage] = (
+                    edges_publisher,
+                    table.getIntegerArrayTopic("histogram").publish(),
+                    table.getIntegerTopic("count").publish(),
+                ) + tuple(
+                    table.getDoubleTopic(key).publish()
+                    for key in ("p50", "p95", "p99", "max")
+                )
+
+            _, histogram_publisher, count_publisher, *percentile_publishers = publishers
+            histogram_publisher.set(histogram.counts.tolist())
+            count_publisher.set(histogram.total)
+            for publisher, value in zip(
+                percentile_publishers, histogram.recent.percentiles()
+            ):
+                publisher.set(value * 1000)
+
+
+input_latency = LatencyMonitor()
@@ -0,0 +1,150 @@
+import functools
+import logging
+from array import array
+from time import perf_counter
+from typing import Callable, Dict, Tuple, TypeVar
+
+from ntcore import NetworkTableInstance
+
+from constants import Constants
+
+F = TypeVar("F", bound=Callable)
+
+logger = logging.getLogger("loop")
+
+
+class TimingBuffer:
+    """fixed size ring buffer of durations in seconds"""
+
+    def __init__(self, size: int) -> None:
+        self.samples = array("d", bytes(8 * size))
+        self.size = size
+        self.index = 0
+        self.count = 0
+
+    def add(self, duration: float) -> None:
+        self.samples[self.index] = duration
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def percentiles(self) -> Tuple[float, float, float, float]:
+        """p50, p95, p99 and max of the buffered durations"""
+        if self.count == 0:
+            return 0.0, 0.0, 0.0, 0.0
+
+        # only sorts at the publish rate, not every loop
+        values = sorted(self.samples[: self.count])
+        last = self.count - 1
+        return (
+            values[int(last * 0.50)],
+            values[int(last * 0.95)],
+            values[int(last * 0.99)],
+            values[last],
+        )
+
+
+class LoopTimer:
+    """
+    Times named sections of the robot loop into ring buffers and publishes
+    their rolling percentiles (in ms) to the LoopTiming table at a low rate.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = Constants.loop_timing_buffer_size,
+        publish_period: float = Constants.loop_timing_publish_period,
+        period: float = Constants.period,
+    ) -> None:
+        self.buffer_size = buffer_size
+        self.publish_every = max(1, round(publish_period / period))
+        self.period = period
+
+        self.buffers: Dict[str, TimingBuffer] = {}
+        self.publishers: Dict[str, Tuple] = {}
+        self.overruns_publisher = None
+
+        self.loop_start = -1.0
+        self.last_loop_time = 0.0
+        self.loops = 0
+        self.overruns = 0
+
+    def get_buffer(self, name: str) -> TimingBuffer:
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            # allocated once, the first time a section runs
+            buffer = self.buffers[name] = TimingBuffer(self.buffer_size)
+        return buffer
+
+    def begin_loop(self) -> None:
+        self.loop_start = perf_counter()
+
+    def start(self) -> float:
+        now = perf_counter()
+        if self.loop_start < 0:
+            self.loop_start = now
+        return now
+
+    def stop(self, name: str, start: float) -> float:
+        duration = perf_counter() - start
+        self.get_buffer(name).add(duration)
+        return duration
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """decorator that records the duration of every call under `name`"""
+
+        def decorator(function: F) -> F:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = self.start()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.stop(name, start)
+
+            return wrapper  # type: ignore
+
+        return decorator
+
+    def end_loop(self) -> None:
+        if self.loop_start < 0:
+            return
+
+        duration = self.stop("loop", self.loop_start)
+        self.loop_start = -1.0
+        self.last_loop_time = duration
+        self.loops += 1
+
+        if duration > self.period:
+            self.overruns += 1
+            logger.warning(
+                "loop overrun: %.2f ms > %.2f ms", duration * 1000, self.period * 1000
+            )
+
+        if self.loops % self.publish_every == 0:
+            self.publish()
+
+    def publish(self) -> None:
+        if self.overruns_publisher is None:
+            self.overruns_publisher = (
+                NetworkTableInstance.getDefault()
+                .getTable("LoopTiming")
+                .getIntegerTopic("overruns")
+                .publish()
+            )
+        self.overruns_publisher.set(self.overruns)
+
+        for name, buffer in self.buffers.items():
+            publishers = self.publishers.get(name)
+            if publishers is None:
+                table = NetworkTableInstance.getDefault().getTable("LoopTiming/" + name)
+                publishers = self.publishers[name] = tuple(
+                    table.getDoubleTopic(key).publish()
+                    for key in ("p50", "p95", "p99", "max")
+                )
+
+            for publisher, value in zip(publishers, buffer.percentiles()):
+                publisher.set(value * 1000)
+
+
+loop_timer = LoopTimer()
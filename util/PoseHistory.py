@@ -0,0 +1,108 @@
+import math
+from array import array
+from typing import Optional
+
+from wpimath.geometry import Pose2d, Rotation2d, Twist2d
+
+
+class PoseHistory:
+    """
+    Fixed capacity ring buffer of timestamped poses for latency compensation.
+    Recording only writes into preallocated arrays, lookups binary search the
+    timestamps and interpolate between the two neighbouring poses.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.xs = array("d", bytes(8 * capacity))
+        self.ys = array("d", bytes(8 * capacity))
+        self.thetas = array("d", bytes(8 * capacity))
+
+        # index of the oldest sample
+        self.start = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def clear(self) -> None:
+        self.start = 0
+        self.count = 0
+
+    def add(self, timestamp: float, x: float, y: float, theta: float) -> None:
+        """
+        Timestamps have to increase: a sample older than the newest one is
+        dropped and one at the same time replaces it.
+        """
+        if self.count:
+            newest = self.timestamps[self.index(self.count - 1)]
+            if timestamp < newest:
+                return
+            if timestamp == newest:
+                self.count -= 1
+
+        if self.count < self.capacity:
+            i = self.index(self.count)
+            self.count += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+
+        self.timestamps[i] = timestamp
+        self.xs[i] = x
+        self.ys[i] = y
+        self.thetas[i] = theta
+
+    def add_pose(self, timestamp: float, pose: Pose2d) -> None:
+        self.add(timestamp, pose.X(), pose.Y(), pose.rotation().radians())
+
+    def index(self, i: int) -> int:
+        return (self.start + i) % self.capacity
+
+    def get_pose(self, i: int) -> Pose2d:
+        i = self.index(i)
+        return Pose2d(self.xs[i], self.ys[i], Rotation2d(self.thetas[i]))
+
+    def search(self, timestamp: float) -> int:
+        """number of samples at or before `timestamp`"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[self.index(middle)] <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def sample(self, timestamp: float, se2: bool = False) -> Optional[Pose2d]:
+        """
+        The pose at `timestamp`, clamped to the oldest and newest sample.
+        Interpolates linearly by default or along the twist between the
+        neighbouring poses when `se2` is set.
+        """
+        if self.count == 0:
+            return None
+
+        after = self.search(timestamp)
+        if after == 0:
+            return self.get_pose(0)
+        if after == self.count:
+            return self.get_pose(self.count - 1)
+
+        before = after - 1
+        i, j = self.index(before), self.index(after)
+        t = (timestamp - self.timestamps[i]) / (self.timestamps[j] - self.timestamps[i])
+
+        if se2:
+            start = self.get_pose(before)
+            twist = start.log(self.get_pose(after))
+            return start.exp(Twist2d(twist.dx * t, twist.dy * t, twist.dtheta * t))
+
+        dtheta = self.thetas[j] - self.thetas[i]
+        dtheta = (dtheta + math.pi) % (2 * math.pi) - math.pi
+        return Pose2d(
+            self.xs[i] + (self.xs[j] - self.xs[i]) * t,
+            self.ys[i] + (self.ys[j] - self.ys[i]) * t,
+            Rotation2d(self.thetas[i] + dtheta * t),
+        )
@@ -0,0 +1,154 @@
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from ntcore import NetworkTableInstance
+from wpilib import getOperatingDirectory
+
+from constants import Constants
+
+# the loggers whose level can be changed from the Logging table
+LOGGERS = ("loop", "auto", "teleop", "startup")
+
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets one record per call site through every `period` seconds and counts the
+    ones it drops. It runs before any handler formats the record, so a dropped
+    message's arguments are never formatted. One instance can be shared by
+    several handlers, every record is only decided once.
+    """
+
+    def __init__(self, period: float = Constants.log_rate_limit_period) -> None:
+        super().__init__()
+        self.period = period
+        # call site -> time of the last record let through, records dropped since
+        self.sites: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        allowed = getattr(record, "rate_limit_allowed", None)
+        if allowed is not None:
+            return allowed
+
+        site = self.sites.get((record.pathname, record.lineno))
+        if site is None:
+            self.sites[(record.pathname, record.lineno)] = [record.created, 0]
+            allowed = True
+        elif record.created - site[0] < self.period:
+            site[1] += 1
+            allowed = False
+        else:
+            if site[1]:
+                record.msg = f"{record.msg} ({site[1]} more suppressed)"
+            site[0] = record.created
+            site[1] = 0
+            allowed = True
+
+        record.rate_limit_allowed = allowed
+        return allowed
+
+
+class RingBufferHandler(logging.Handler):
+    """keeps the last records unformatted until they are dumped"""
+
+    def __init__(self, capacity: int = Constants.log_ring_buffer_size) -> None:
+        super().__init__()
+        self.records: Deque[logging.LogRecord] = deque(maxlen=capacity)
+        self.setFormatter(logging.Formatter(FORMAT))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as file:
+            for record in self.records:
+                file.write(self.format(record) + "\n")
+
+
+class RobotLog:
+    """
+    Robot wide logging setup on top of the logging module: call site rate
+    limiting on every handler, a ring buffer of recent records that's written
+    to a file when something faults, and logger levels set from the Logging
+    table, e.g. Logging/loop = DEBUG.
+    """
+
+    def __init__(
+        self,
+        directory: str = os.path.join(getOperatingDirectory(), "logs"),
+        dump_period: float = Constants.log_fault_dump_period,
+        poll_period: float = Constants.log_level_poll_period,
+        period: float = Constants.period,
+    ) -> None:
+        self.directory = directory
+        self.dump_period = dump_period
+        self.poll_every = max(1, round(poll_period / period))
+
+        self.rate_limit = RateLimitFilter()
+        self.ring_buffer = RingBufferHandler()
+        self.ring_buffer.addFilter(self.rate_limit)
+
+        self.level_entries: Dict[str, object] = {}
+        self.levels: Dict[str, str] = {}
+        self.loops = 0
+        self.dumped_at = -dump_period
+
+    def configure(self, level: int = logging.INFO) -> None:
+        root = logging.getLogger()
+        if not root.handlers:
+            logging.basicConfig(format=FORMAT)
+        for handler in root.handlers:
+            handler.addFilter(self.rate_limit)
+        root.addHandler(self.ring_buffer)
+
+        table = NetworkTableInstance.getDefault().getTable("Logging")
+        for name in LOGGERS:
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            self.levels[name] = logging.getLevelName(level)
+            entry = table.getStringTopic(name).getEntry(self.levels[name])
+            entry.set(self.levels[name])
+            self.level_entries[name] = entry
+
+    def poll(self) -> None:
+        """apply levels changed over NetworkTables, checked at a low rate"""
+        self.loops += 1
+        if self.loops % self.poll_every != 0:
+            return
+
+        for name, entry in self.level_entries.items():
+            level = entry.get().upper()
+            if level == self.levels[name]:
+                continue
+            self.levels[name] = level
+            if isinstance(logging.getLevelName(level), int):
+                logging.getLogger(name).setLevel(level)
+                logging.getLogger("startup").info("%s log level set to %s", name, level)
+            else:
+                logging.getLogger("startup").warning(
+                    "unknown log level %r for %s", level, name
+                )
+
+    def dump(self, reason: str) -> None:
+        """
+        Write the buffered records to a file after a fault, at most once every
+        dump period so a fault repeating every loop doesn't write every loop.
+        """
+        now = time.monotonic()
+        if now - self.dumped_at < self.dump_period:
+            return
+        self.dumped_at = now
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(
+            self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{reason}.log"
+        )
+        self.ring_buffer.dump(path)
+        logging.getLogger("startup").error("wrote the recent log to %s", path)
+
+
+robot_log = RobotLog()
@@ -0,0 +1,241 @@
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from wpimath.geometry import Rotation2d, Translation2d
+from wpimath.kinematics import ChassisSpeeds, SwerveModuleState
+
+
+def wrap_angle(angles: np.ndarray) -> np.ndarray:
+    """wrap radians to [-pi, pi)"""
+    return (angles + math.pi) % (2 * math.pi) - math.pi
+
+
+def wrap_angle_into(angles: np.ndarray) -> None:
+    """wrap radians to [-pi, pi) in place"""
+    angles += math.pi
+    np.remainder(angles, 2 * math.pi, out=angles)
+    angles -= math.pi
+
+
+class SwerveKinematics:
+    """
+    Swerve kinematics for any number of modules, computed on numpy arrays.
+
+    Module velocities (vx0, vy0, vx1, vy1, ...) are
+    `inverse_matrix @ (vx, vy, omega)`, the chassis speeds are recovered with its
+    pseudo-inverse (least squares). to_module_states and to_chassis_speeds
+    accept a single set of speeds or a batch (e.g. a whole trajectory) with the
+    speeds in the last axis and keep no state, to_module_states_into drives the
+    robot and keeps the module headings between calls.
+    """
+
+    def __init__(self, translations: Sequence[Translation2d]) -> None:
+        self.module_count = len(translations)
+
+        self.inverse_matrix = np.zeros((2 * self.module_count, 3))
+        for i, translation in enumerate(translations):
+            self.inverse_matrix[2 * i] = (1, 0, -translation.y)
+            self.inverse_matrix[2 * i + 1] = (0, 1, translation.x)
+        self.forward_matrix = np.linalg.pinv(self.inverse_matrix)
+
+        # like wpimath, to_module_states_into keeps the last headings when the
+        # chassis is not moving
+        self.module_headings = np.zeros(self.module_count)
+
+        # scratch buffers of to_module_states_into
+        self.velocities = np.zeros(2 * self.module_count)
+        self.velocities_x = self.velocities[0::2]
+        self.velocities_y = self.velocities[1::2]
+        self.angle_errors = np.zeros(self.module_count)
+        self.flip = np.zeros(self.module_count, dtype=bool)
+
+    def to_module_states(
+        self,
+        chassis_speeds: np.ndarray,
+        current_angles: Optional[np.ndarray] = None,
+        max_speed: Optional[float] = None,
+        headings: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Module speeds and angles (radians) for one set of chassis speeds `(3,)`
+        of (vx, vy, omega) or a sequence of them `(rows, 3)`, desaturated to
+        `max_speed` and optimized against `current_angles` when given. Stopped
+        rows keep the headings of the last moving one, starting from `headings`
+        (zeros by default), and the headings for the next call come back last.
+        """
+        chassis_speeds = np.asarray(chassis_speeds, dtype=float)
+        if chassis_speeds.ndim not in (1, 2):
+            raise ValueError(
+                f"chassis speeds of shape {chassis_speeds.shape}, not (3,) or (rows, 3)"
+            )
+        if headings is None:
+            headings = np.zeros(self.module_count)
+
+        velocities = chassis_speeds @ self.inverse_matrix.T
+        vx = velocities[..., 0::2]
+        vy = velocities[..., 1::2]
+
+        speeds = np.hypot(vx, vy)
+        angles = np.arctan2(vy, vx)
+
+        moving = np.any(chassis_speeds != 0, axis=-1)
+        if chassis_speeds.ndim == 1:
+            if moving:
+                headings = angles.copy()
+            else:
+                angles = np.array(headings, dtype=float)
+        elif len(angles):
+            # carry the heading of the last moving row forward over stopped rows
+            rows = np.arange(len(angles))
+            last_moving = np.maximum.accumulate(np.where(moving, rows, -1))
+            angles = np.where(
+                (last_moving >= 0)[:, None],
+                angles[np.maximum(last_moving, 0)],
+                headings,
+            )
+            headings = angles[-1].copy()
+
+        if max_speed is not None:
+            self.desaturate(speeds, max_speed)
+
+        if current_angles is not None:
+            self.optimize(speeds, angles, current_angles)
+
+        return speeds, angles, headings
+
+    def to_module_states_into(
+        self,
+        chassis_speeds: np.ndarray,
+        current_angles: np.ndarray,
+        max_speed: float,
+        speeds: np.ndarray,
+        angles: np.ndarray,
+    ) -> None:
+        """
+        Like to_module_states for a single set of chassis speeds, but writes into
+        `speeds` and `angles` and reuses scratch buffers, so nothing is allocated.
+        """
+        np.matmul(self.inverse_matrix, chassis_speeds, out=self.velocities)
+        vx = self.velocities_x
+        vy = self.velocities_y
+        np.hypot(vx, vy, out=speeds)
+
+        if chassis_speeds.any():
+            np.arctan2(vy, vx, out=angles)
+            self.module_headings[:] = angles
+        else:
+            angles[:] = self.module_headings
+
+        fastest = speeds.max()
+        if fastest > max_speed:
+            speeds *= max_speed / fastest
+
+        errors = self.angle_errors
+        np.subtract(angles, current_angles, out=errors)
+        wrap_angle_into(errors)
+        np.abs(errors, out=errors)
+        np.greater(errors, math.pi / 2, out=self.flip)
+        np.negative(speeds, out=speeds, where=self.flip)
+        np.add(angles, math.pi, out=angles, where=self.flip)
+        wrap_angle_into(angles)
+
+    @staticmethod
+    def desaturate(speeds: np.ndarray, max_speed: float) -> None:
+        """scale each set of module speeds in place so none exceeds `max_speed`"""
+        fastest = np.max(np.abs(speeds), axis=-1, keepdims=True)
+        speeds *= np.where(
+            fastest > max_speed, max_speed / np.maximum(fastest, 1e-9), 1
+        )
+
+    @staticmethod
+    def optimize(
+        speeds: np.ndarray, angles: np.ndarray, current_angles: np.ndarray
+    ) -> None:
+        """flip modules in place that would have to turn more than 90 degrees"""
+        flip = np.abs(wrap_angle(angles - current_angles)) > math.pi / 2
+        speeds[flip] *= -1
+        angles[flip] += math.pi
+        angles[...] = wrap_angle(angles)
+
+    def to_chassis_speeds(self, speeds: np.ndarray, angles: np.ndarray) -> np.ndarray:
+        """chassis speeds `(..., 3)` of (vx, vy, omega) best fitting the modules"""
+        speeds = np.asarray(speeds, dtype=float)
+        angles = np.asarray(angles, dtype=float)
+        velocities = np.empty(speeds.shape[:-1] + (2 * self.module_count,))
+        velocities[..., 0::2] = speeds * np.cos(angles)
+        velocities[..., 1::2] = speeds * np.sin(angles)
+        return velocities @ self.forward_matrix.T
+
+    @staticmethod
+    def to_states(
+        speeds: np.ndarray, angles: np.ndarray
+    ) -> Tuple[SwerveModuleState, ...]:
+        return tuple(
+            SwerveModuleState(speed, Rotation2d(angle))
+            for speed, angle in zip(speeds.tolist(), angles.tolist())
+        )
+
+
+def benchmark(iterations: int = 2000, trajectory_length: int = 1000) -> None:
+    """time against the wpimath path, tests/test_SwerveKinematics.py checks both agree"""
+    from timeit import timeit
+
+    from wpimath.kinematics import SwerveDrive4Kinematics
+
+    from constants import SwerveConstants
+
+    kinematics = SwerveKinematics(SwerveConstants.kModuleTranslations)
+    wpimath_kinematics = SwerveDrive4Kinematics(*SwerveConstants.kModuleTranslations)
+    max_speed = SwerveConstants.kWheelMaxSpeedMetersPerSecond
+
+    rng = np.random.default_rng(0)
+    chassis_speeds = rng.uniform(-3, 3, (trajectory_length, 3))
+    current_angles = rng.uniform(-math.pi, math.pi, (trajectory_length, 4))
+
+    def wpimath_states(speeds, current):
+        states = wpimath_kinematics.toSwerveModuleStates(ChassisSpeeds(*speeds))
+        SwerveDrive4Kinematics.desaturateWheelSpeeds(states, max_speed)
+        return [
+            SwerveModuleState.optimize(state, Rotation2d(angle))
+            for state, angle in zip(states, current)
+        ]
+
+    single = chassis_speeds[0].tolist()
+    single_current = current_angles[0].tolist()
+    single_array = chassis_speeds[0]
+    single_current_array = current_angles[0]
+
+    wpimath_time = timeit(
+        lambda: wpimath_states(single, single_current), number=iterations
+    )
+    numpy_time = timeit(
+        lambda: kinematics.to_module_states(
+            single_array, single_current_array, max_speed
+        ),
+        number=iterations,
+    )
+    wpimath_batch_time = timeit(
+        lambda: [
+            wpimath_states(chassis_speeds[row].tolist(), current_angles[row].tolist())
+            for row in range(trajectory_length)
+        ],
+        number=1,
+    )
+    numpy_batch_time = timeit(
+        lambda: kinematics.to_module_states(chassis_speeds, current_angles, max_speed),
+        number=1,
+    )
+
+    print(
+        f"single:     wpimath {wpimath_time / iterations * 1e6:8.2f} us"
+        f"  numpy {numpy_time / iterations * 1e6:8.2f} us"
+    )
+    print(
+        f"{trajectory_length} states: wpimath {wpimath_batch_time * 1e3:8.2f} ms"
+        f"  numpy {numpy_batch_time * 1e3:8.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    benchmark()
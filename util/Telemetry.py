@@ -0,0 +1,158 @@
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from ntcore import NetworkTableInstance
+
+from constants import Constants
+
+# called on the telemetry thread with the channel names, and the timestamps and
+# frames (one row per loop, one column per channel) published since the last call
+Sink = Callable[[List[str], np.ndarray, np.ndarray], None]
+
+
+class Telemetry:
+    """
+    Values recorded during a loop go into one preallocated frame, one slot per
+    channel. end_loop() copies the frame into a bounded ring of frames that a
+    background thread publishes to NetworkTables (and any other sinks, e.g. a
+    log) every `publish_period`. When the thread falls behind, the oldest
+    frames are dropped and counted, so the robot loop never waits on I/O.
+    """
+
+    def __init__(
+        self,
+        table_name: str = "SmartDashboard",
+        capacity: int = Constants.telemetry_queue_size,
+        max_channels: int = Constants.telemetry_max_channels,
+        publish_period: float = Constants.telemetry_publish_period,
+    ) -> None:
+        self.table_name = table_name
+        self.publish_period = publish_period
+
+        self.channels: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.frame = np.zeros(max_channels)
+
+        # ring of frames waiting for the thread, guarded by the lock
+        self.lock = threading.Lock()
+        self.frames = np.zeros((capacity, max_channels))
+        self.timestamps = np.zeros(capacity)
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+
+        # owned by the thread, the ring is copied here so sinks run unlocked
+        self.drained_frames = np.zeros((capacity, max_channels))
+        self.drained_timestamps = np.zeros(capacity)
+
+        self.sinks: List[Sink] = [self.publish]
+        self.publishers: List = []
+        self.dropped_publisher = None
+
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def channel(self, name: str) -> int:
+        """the frame slot of a channel, registering it the first time"""
+        index = self.channels.get(name)
+        if index is None:
+            index = len(self.names)
+            if index == len(self.frame):
+                raise ValueError(f"more than {index} telemetry channels, at {name}")
+            self.channels[name] = index
+            self.names.append(name)
+        return index
+
+    def channels(self, names: List[str]) -> slice:
+        """consecutive frame slots for a group of channels, e.g. one per module"""
+        indices = [self.channel(name) for name in names]
+        block = slice(indices[0], indices[0] + len(indices))
+        if indices != list(range(block.start, block.stop)):
+            raise ValueError(f"telemetry channels {names} were registered apart")
+        return block
+
+    def record(self, name: str, value: float) -> None:
+        """set a channel in this loop's frame, it keeps the value until set again"""
+        self.frame[self.channel(name)] = value
+
+    def end_loop(self, timestamp: float) -> None:
+        """queue this loop's frame for the thread"""
+        with self.lock:
+            capacity = len(self.timestamps)
+            if self.count == capacity:
+                # drop the oldest frame, the newest is worth more
+                self.head = (self.head + 1) % capacity
+                self.count -= 1
+                self.dropped += 1
+            index = (self.head + self.count) % capacity
+            self.frames[index] = self.frame
+            self.timestamps[index] = timestamp
+            self.count += 1
+
+    def add_sink(self, sink: Sink) -> None:
+        self.sinks.append(sink)
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, name="telemetry", daemon=True
+            )
+            self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.stopped.clear()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.publish_period):
+            self.flush()
+        self.flush()
+
+    def drain(self) -> int:
+        """move the queued frames into the drained buffers, oldest first"""
+        with self.lock:
+            count = self.count
+            capacity = len(self.timestamps)
+            first = min(count, capacity - self.head)
+            self.drained_frames[:first] = self.frames[self.head : self.head + first]
+            self.drained_frames[first:count] = self.frames[: count - first]
+            self.drained_timestamps[:first] = self.timestamps[
+                self.head : self.head + first
+            ]
+            self.drained_timestamps[first:count] = self.timestamps[: count - first]
+            self.head = (self.head + count) % capacity
+            self.count = 0
+        return count
+
+    def flush(self) -> None:
+        count = self.drain()
+        if count == 0:
+            return
+
+        names = self.names[:]
+        timestamps = self.drained_timestamps[:count]
+        frames = self.drained_frames[:count, : len(names)]
+        for sink in self.sinks:
+            sink(names, timestamps, frames)
+
+    def publish(self, names: List[str], timestamps: np.ndarray, frames: np.ndarray):
+        """NetworkTables only needs the latest value of every channel"""
+        table = NetworkTableInstance.getDefault().getTable(self.table_name)
+        while len(self.publishers) < len(names):
+            name = names[len(self.publishers)]
+            self.publishers.append(table.getDoubleTopic(name).publish())
+        if self.dropped_publisher is None:
+            self.dropped_publisher = table.getIntegerTopic(
+                "Telemetry Dropped Frames"
+            ).publish()
+
+        for publisher, value in zip(self.publishers, frames[-1].tolist()):
+            publisher.set(value)
+        self.dropped_publisher.set(self.dropped)
+
+
+telemetry = Telemetry()
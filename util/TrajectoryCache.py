@@ -0,0 +1,154 @@
+import hashlib
+import os
+import struct
+from typing import Dict, Optional, Sequence
+
+from wpilib import getDeployDirectory
+from wpimath.geometry import Pose2d, Rotation2d, Translation2d
+from wpimath.trajectory import Trajectory, TrajectoryConfig, TrajectoryGenerator
+
+from constants import AutoConstants, SwerveConstants
+
+MAGIC = b"TRJ1"
+HEADER = struct.Struct("<4sI")
+# t, velocity, acceleration, x, y, heading, curvature
+STATE = struct.Struct("<7d")
+
+
+def make_trajectory_config() -> TrajectoryConfig:
+    trajectory_config = TrajectoryConfig(
+        SwerveConstants.kDriveMaxMetersPerSecond,
+        SwerveConstants.kDriveMaxAccelerationMetersPerSecond,
+    )
+    trajectory_config.setKinematics(SwerveConstants.kDriveKinematics)
+    return trajectory_config
+
+
+def trajectory_key(
+    start: Pose2d,
+    interior: Sequence[Translation2d],
+    end: Pose2d,
+    config: TrajectoryConfig,
+) -> str:
+    """hash of everything the generated trajectory depends on"""
+    values = [start.X(), start.Y(), start.rotation().radians()]
+    for translation in interior:
+        values += [translation.X(), translation.Y()]
+    values += [end.X(), end.Y(), end.rotation().radians()]
+    values += [
+        config.maxVelocity(),
+        config.maxAcceleration(),
+        config.startVelocity(),
+        config.endVelocity(),
+        float(config.isReversed()),
+    ]
+    # the kinematics constraint can't be read back from the config
+    for translation in SwerveConstants.kModuleTranslations:
+        values += [translation.X(), translation.Y()]
+
+    data = struct.pack(f"<I{len(values)}d", len(interior), *values)
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def save_trajectory(path: str, trajectory: Trajectory) -> None:
+    states = trajectory.states()
+    data = bytearray(HEADER.pack(MAGIC, len(states)))
+    for state in states:
+        data += STATE.pack(
+            state.t,
+            state.velocity,
+            state.acceleration,
+            state.pose.X(),
+            state.pose.Y(),
+            state.pose.rotation().radians(),
+            state.curvature,
+        )
+
+    # write then rename so an interrupted deploy never leaves half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def load_trajectory(path: str) -> Trajectory:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, count = HEADER.unpack_from(data)
+    if magic != MAGIC or len(data) != HEADER.size + count * STATE.size:
+        raise ValueError(f"{path} is not a trajectory file")
+
+    states = []
+    for t, velocity, acceleration, x, y, heading, curvature in STATE.iter_unpack(
+        data[HEADER.size :]
+    ):
+        pose = Pose2d(x, y, Rotation2d(heading))
+        states.append(Trajectory.State(t, velocity, acceleration, pose, curvature))
+    return Trajectory(states)
+
+
+class TrajectoryCache:
+    """
+    Trajectories stored in the deploy directory keyed by a hash of their
+    waypoints and config, they are only generated when the file is missing.
+    """
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        if directory is None:
+            directory = os.path.join(
+                getDeployDirectory(), AutoConstants.trajectory_directory
+            )
+        self.directory = directory
+
+        self.trajectories: Dict[str, Trajectory] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        start: Pose2d,
+        interior: Sequence[Translation2d],
+        end: Pose2d,
+        config: TrajectoryConfig,
+    ) -> Trajectory:
+        key = trajectory_key(start, interior, end, config)
+        trajectory = self.trajectories.get(key)
+        if trajectory is not None:
+            return trajectory
+
+        path = os.path.join(self.directory, key + ".traj")
+        try:
+            trajectory = load_trajectory(path)
+            self.hits += 1
+        except (OSError, ValueError, struct.error):
+            trajectory = TrajectoryGenerator.generateTrajectory(
+                start, list(interior), end, config
+            )
+            self.misses += 1
+            try:
+                save_trajectory(path, trajectory)
+            except OSError:
+                # still usable from memory
+                pass
+
+        self.trajectories[key] = trajectory
+        return trajectory
+
+    def load_autos(self) -> Dict[str, Trajectory]:
+        """every trajectory in AutoConstants.trajectories by name"""
+        config = make_trajectory_config()
+        return {
+            name: self.get(start, interior, end, config)
+            for name, (start, interior, end) in AutoConstants.trajectories.items()
+        }
+
+
+if __name__ == "__main__":
+    # run before deploying so the robot never generates trajectories itself
+    cache = TrajectoryCache()
+    trajectories = cache.load_autos()
+    print(
+        f"{len(trajectories)} trajectories in {cache.directory}: "
+        f"{cache.misses} generated, {cache.hits} already cached"
+    )